@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.documents import Document
+
+
+SHARED_SCOPE = ""
+
+
+def guides_scope(version):
+    return f"guides:{version}" if version else SHARED_SCOPE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    language TEXT NOT NULL,
+    context_hash TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    sources TEXT NOT NULL,
+    source_from_document INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_key ON answers (scope, language, context_hash);
+CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    def __init__(self, path, similarity_threshold, ttl_seconds, max_entries):
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _bump(self, conn, name):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def lookup(self, question_vector, language, document_context, scope=SHARED_SCOPE):
+        query = _normalize(question_vector)
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, embedding, answer, sources, source_from_document FROM answers "
+                "WHERE scope = ? AND language = ? AND context_hash = ? AND created_at >= ?",
+                (scope, language, hash_text(document_context), now - self.ttl_seconds)
+            ).fetchall()
+
+            best = None
+            if rows:
+                matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                scores = matrix @ query
+                i = int(np.argmax(scores))
+                if scores[i] >= self.similarity_threshold:
+                    best = rows[i]
+
+            if best is None:
+                self._bump(conn, "misses")
+                return None
+
+            conn.execute("UPDATE answers SET last_access = ? WHERE id = ?", (now, best[0]))
+            self._bump(conn, "hits")
+
+        return {
+            "answer": best[2],
+            "sources": [Document(**source) for source in json.loads(best[3])],
+            "source_from_document": bool(best[4])
+        }
+
+    def store(self, question, question_vector, language, document_context,
+              answer, sources, source_from_document, scope=SHARED_SCOPE):
+        now = time.time()
+        serialized_sources = json.dumps(
+            [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in sources]
+        )
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO answers (scope, language, context_hash, embedding, question, answer, "
+                "sources, source_from_document, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (scope, language, hash_text(document_context), _normalize(question_vector).tobytes(),
+                 question, answer, serialized_sources, int(source_from_document), now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+        overflow = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM answers WHERE id IN "
+                "(SELECT id FROM answers ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('evictions', ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (overflow,)
+            )
+
+    def stats(self):
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0
+        }
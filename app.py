@@ -1,26 +1,38 @@
+import time
+
+script_start = time.perf_counter()
+
 import streamlit as st
-import google.generativeai as genai
 from PIL import Image
 import io
+import logging
+import uuid
 
 from config import (
-    MODEL_NAME,
+    CHAT_RENDER_CONFIG,
     SUPPORTED_FILE_TYPES,
-    LANGUAGES
-)
-from rag_pipeline import build_rag_chain
-from document_processor import (
-    extract_and_explain_document,
-    audit_response_source,
-    compress_image
+    LANGUAGES,
+    TRACING_CONFIG
 )
+from document_cache import hash_bytes
+from startup import STARTUP
 from ui_components import (
     render_language_selector_and_buttons,
     render_document_context_info,
+    build_source_previews,
     render_chat_messages,
+    render_sources,
+    render_startup_report,
+    render_trace_panel,
+    render_session_memory,
     render_disclaimer
 )
 
+imports_done = time.perf_counter()
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 st.set_page_config(
     page_title="Nyay-Saathi",
@@ -37,7 +49,7 @@ st.markdown(
 )
 
 try:
-    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
+    api_key = st.secrets["GOOGLE_API_KEY"]
 except Exception as e:
     st.error(f"Error configuring: {e}. Please check your API key in Streamlit Secrets.")
     st.stop()
@@ -47,26 +59,57 @@ if "app_started" not in st.session_state:
     st.session_state.app_started = False
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "document_context" not in st.session_state:
-    st.session_state.document_context = "No document uploaded."
-if "uploaded_file_bytes" not in st.session_state:
-    st.session_state.uploaded_file_bytes = None
+if "document_blob" not in st.session_state:
+    st.session_state.document_blob = None
+if "uploaded_file_blob" not in st.session_state:
+    st.session_state.uploaded_file_blob = None
 if "uploaded_file_type" not in st.session_state:
     st.session_state.uploaded_file_type = None
+if "uploaded_file_name" not in st.session_state:
+    st.session_state.uploaded_file_name = None
+if "uploaded_file_hash" not in st.session_state:
+    st.session_state.uploaded_file_hash = None
+if "image_preprocess_stats" not in st.session_state:
+    st.session_state.image_preprocess_stats = None
 if "samjhao_explanation" not in st.session_state:
     st.session_state.samjhao_explanation = None
+if "samjhao_language" not in st.session_state:
+    st.session_state.samjhao_language = None
 if "file_uploader_key" not in st.session_state:
     st.session_state.file_uploader_key = 0
 if "selected_language" not in st.session_state:
     st.session_state.selected_language = "Simple English"
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "last_trace" not in st.session_state:
+    st.session_state.last_trace = None
+if "history_summaries" not in st.session_state:
+    st.session_state.history_summaries = {}
+if "chat_visible" not in st.session_state:
+    st.session_state.chat_visible = CHAT_RENDER_CONFIG["page_size"]
+if "last_rerun" not in st.session_state:
+    st.session_state.last_rerun = None
+
+
+def reset_document():
+    st.session_state.document_blob = None
+    st.session_state.uploaded_file_blob = None
+    st.session_state.uploaded_file_type = None
+    st.session_state.uploaded_file_name = None
+    st.session_state.uploaded_file_hash = None
+    st.session_state.image_preprocess_stats = None
+    st.session_state.samjhao_explanation = None
 
 
 def clear_session():
+    from blob_store import get_blob_store
+
+    get_blob_store().release(st.session_state.session_id)
     st.session_state.messages = []
-    st.session_state.document_context = "No document uploaded."
-    st.session_state.uploaded_file_bytes = None
-    st.session_state.uploaded_file_type = None
-    st.session_state.samjhao_explanation = None
+    st.session_state.history_summaries = {}
+    st.session_state.chat_visible = CHAT_RENDER_CONFIG["page_size"]
+    reset_document()
+    st.session_state.last_trace = None
     st.session_state.file_uploader_key += 1
 
 
@@ -76,18 +119,70 @@ if not st.session_state.app_started:
     st.markdown("This tool helps you understand complex legal documents and get clear, simple action plans.")
     st.markdown("---")
 
-    if st.button("Click here to start", type="primary"):
+    clicked = st.button("Click here to start", type="primary")
+    STARTUP.mark_first_paint(script_start, imports_done)
+    STARTUP.start_warmup(api_key)
+    if clicked:
         st.session_state.app_started = True
         st.rerun()
 
 else:
+    from rag_pipeline import (
+        build_rag_chain,
+        get_answer_cache,
+        get_document_index,
+        get_embeddings,
+        get_retriever,
+        retrieve_document_context,
+        stream_rag_answer
+    )
+    from answer_cache import guides_scope
+    from blob_store import estimate_size, get_blob_store
+    from document_processor import (
+        extract_and_explain_document,
+        attribute_response_source,
+        preprocess_image
+    )
+    from llm_gateway import GatewayError, configure_gateway
+    from tracing import Trace, get_registry, span, start_metrics_server
+
+    configure_gateway(api_key=api_key)
+    start_metrics_server()
+    STARTUP.start_warmup(api_key)
+    debug = TRACING_CONFIG["debug_panel"] or st.query_params.get("debug") == "1"
+    session_id = st.session_state.session_id
+    blobs = get_blob_store()
+    blobs.touch(session_id)
+
+    document_context = "No document uploaded."
+    file_bytes = None
+    if st.session_state.document_blob is not None:
+        document_context = blobs.get_text(st.session_state.document_blob)
+    if st.session_state.uploaded_file_blob is not None:
+        file_bytes = blobs.get(st.session_state.uploaded_file_blob)
+    if document_context is None or (st.session_state.uploaded_file_blob is not None and file_bytes is None):
+        reset_document()
+        document_context, file_bytes = "No document uploaded.", None
+        st.warning("Your uploaded document was cleared after a long break. Please upload it again.")
+
     st.title("🤝 Nyay-Saathi (Justice Companion)")
     st.markdown("Your legal friend, in your pocket. Built for India.")
+    if STARTUP.state == "running":
+        st.caption("⏳ Loading the legal guides in the background...")
 
-    language = render_language_selector_and_buttons()
+    language = render_language_selector_and_buttons(on_new_session=clear_session)
     st.session_state.selected_language = language
     st.divider()
 
+    def show_earlier_messages():
+        st.session_state.chat_visible += CHAT_RENDER_CONFIG["page_size"]
+
+    def record_feedback(message_index, vote):
+        logger.info("Feedback %s on message %d of session %s", vote, message_index, session_id[:8])
+        registry = get_registry()
+        if registry is not None:
+            registry.add("nyay_feedback_total", (("vote", vote),), 1)
+
     tab1, tab2 = st.tabs(["**Samjhao** (Explain this Document)", "**Kya Karoon?** (Ask a Question)"])
 
     with tab1:
@@ -102,24 +197,38 @@ else:
 
         if uploaded_file is not None:
             new_file_bytes = uploaded_file.getvalue()
-            if new_file_bytes != st.session_state.uploaded_file_bytes:
+            upload_hash = hash_bytes(new_file_bytes)
+            if upload_hash != st.session_state.uploaded_file_hash:
                 if "image" in uploaded_file.type:
-                    compressed_bytes = compress_image(new_file_bytes)
-                    st.session_state.uploaded_file_bytes = compressed_bytes
+                    processed_bytes, stats = preprocess_image(upload_hash, new_file_bytes)
+                    file_type = "image/jpeg" if stats else uploaded_file.type
                 else:
-                    st.session_state.uploaded_file_bytes = new_file_bytes
+                    processed_bytes, stats, file_type = new_file_bytes, None, uploaded_file.type
+
+                reset_document()
+                blobs.release(session_id, "document_text")
+                st.session_state.uploaded_file_blob = blobs.put(session_id, "upload", processed_bytes)
+                st.session_state.uploaded_file_type = file_type
+                st.session_state.uploaded_file_name = uploaded_file.name
+                st.session_state.uploaded_file_hash = upload_hash
+                st.session_state.image_preprocess_stats = stats
 
-                st.session_state.uploaded_file_type = uploaded_file.type
-                st.session_state.samjhao_explanation = None
-                st.session_state.document_context = "No document uploaded."
+            st.session_state.file_uploader_key += 1
+            st.rerun()
 
-        if st.session_state.uploaded_file_bytes is not None:
-            file_bytes = st.session_state.uploaded_file_bytes
+        if file_bytes is not None:
             file_type = st.session_state.uploaded_file_type
+            st.caption(f"📄 {st.session_state.uploaded_file_name} (upload another file to replace it)")
 
             if "image" in file_type:
                 image = Image.open(io.BytesIO(file_bytes))
                 st.image(image, caption="Your Uploaded Document", use_column_width=True)
+                stats = st.session_state.image_preprocess_stats
+                if stats:
+                    st.caption(
+                        f"Optimized for reading: {stats['input_bytes'] / 1024:.0f} KB → "
+                        f"{stats['output_bytes'] / 1024:.0f} KB in {stats['ms']:.0f} ms"
+                    )
             elif "pdf" in file_type:
                 st.info("PDF file uploaded. Click 'Samjhao!' to explain.")
 
@@ -128,7 +237,7 @@ else:
                 if "image" in file_type:
                     spinner_text = "Reading your image... (this can take 15-30s)"
 
-                with st.spinner(spinner_text):
+                with st.spinner(spinner_text), Trace("samjhao") as trace:
                     explanation, raw_text = extract_and_explain_document(
                         file_bytes,
                         file_type,
@@ -137,13 +246,28 @@ else:
 
                     if explanation and raw_text:
                         st.session_state.samjhao_explanation = explanation
-                        st.session_state.document_context = raw_text
+                        st.session_state.samjhao_language = language
+                        st.session_state.document_blob = blobs.put_text(session_id, "document_text", raw_text)
+                        document_context = raw_text
+                        with span("document_index"):
+                            get_document_index(st.session_state.document_blob, raw_text)
+                st.session_state.last_trace = trace.summary()
+
+            elif (st.session_state.samjhao_explanation and
+                    st.session_state.samjhao_language != language):
+                with st.spinner(f"Explaining in {language}..."), Trace("samjhao") as trace:
+                    explanation, _ = extract_and_explain_document(file_bytes, file_type, language)
+
+                    if explanation:
+                        st.session_state.samjhao_explanation = explanation
+                        st.session_state.samjhao_language = language
+                st.session_state.last_trace = trace.summary()
 
         if st.session_state.samjhao_explanation:
             st.subheader(f"Here's what it means in {language}:")
             st.markdown(st.session_state.samjhao_explanation)
 
-        if (st.session_state.document_context != "No document uploaded." and
+        if (document_context != "No document uploaded." and
                 st.session_state.samjhao_explanation):
             st.success("Context Saved! You can now ask questions about this document in the 'Kya Karoon?' tab.")
 
@@ -155,61 +279,158 @@ else:
             st.write("Scared? Confused? Ask a question and get a simple 3-step plan **based on real guides.**")
         with col2:
             if st.button("Clear Chat ♻️", key="clear_chat_btn"):
+                blobs.release(session_id, prefix="sources:")
                 st.session_state.messages = []
+                st.session_state.history_summaries = {}
+                st.session_state.chat_visible = CHAT_RENDER_CONFIG["page_size"]
                 st.rerun()
 
-        render_document_context_info(st.session_state.document_context)
+        render_document_context_info(document_context)
 
-        render_chat_messages(
+        rendered_messages = render_chat_messages(
             st.session_state.messages,
-            st.session_state.document_context,
+            blobs.get_json,
+            st.session_state.chat_visible,
+            show_earlier_messages,
             show_sources=True,
-            show_feedback=True
+            show_feedback=True,
+            on_feedback=record_feedback
         )
 
         if prompt := st.chat_input(f"Ask your follow-up question in {language}..."):
             st.session_state.messages.append({"role": "user", "content": prompt})
 
-            with st.spinner("Your friend is checking the guides..."):
-                try:
-                    rag_chain = build_rag_chain()
-
-                    chat_history_str = "\n".join(
-                        [f"{m['role']}: {m['content']}" for m in st.session_state.messages[-3:]]
-                    )
-                    current_doc_context = st.session_state.document_context
-
-                    invoke_payload = {
-                        "question": prompt,
-                        "language": language,
-                        "chat_history": chat_history_str,
-                        "document_context": current_doc_context
-                    }
-
-                    response_dict = rag_chain.invoke(invoke_payload)
-                    response = response_dict["answer"]
-                    docs = response_dict["sources"]
-
-                    used_document = False
+            with st.chat_message("user"):
+                st.markdown(prompt)
+
+            try:
+                with Trace("chat") as trace:
+                    with span("load_pipeline"):
+                        rag_chain = build_rag_chain()
+                        answer_cache = get_answer_cache()
+
+                    chat_history = [
+                        {"role": m["role"], "content": m["content"]} for m in st.session_state.messages[:-1]
+                    ]
+                    current_doc_context = document_context
+                    has_document = current_doc_context != "No document uploaded."
+                    if has_document:
+                        cache_scope = session_id
+                    else:
+                        cache_scope = guides_scope(get_retriever().version)
+                    is_follow_up = any(m["role"] == "assistant" for m in st.session_state.messages)
+
+                    cached = None
+                    if not is_follow_up:
+                        with st.spinner("Your friend is checking the guides..."), span("answer_cache") as opened:
+                            question_vector = get_embeddings().embed_query(prompt)
+                            cached = answer_cache.lookup(question_vector, language, current_doc_context, cache_scope)
+                            opened.set(hit=cached is not None)
+
+                    if cached:
+                        response = cached["answer"]
+                        docs = cached["sources"]
+                        used_document = cached["source_from_document"]
+                    else:
+                        prompt_doc_context = current_doc_context
+                        document_index = None
+                        if st.session_state.document_blob is not None:
+                            with span("document_index"):
+                                document_index = get_document_index(st.session_state.document_blob,
+                                                                    current_doc_context)
+                        if document_index is not None:
+                            prompt_doc_context = retrieve_document_context(
+                                document_index,
+                                prompt,
+                                current_doc_context
+                            )
 
-                    if not docs and current_doc_context != "No document uploaded.":
-                        with st.spinner("Auditing response source..."):
-                            used_document = audit_response_source(
+                        invoke_payload = {
+                            "question": prompt,
+                            "language": language,
+                            "chat_history": chat_history,
+                            "document_context": prompt_doc_context,
+                            "history_summaries": st.session_state.history_summaries
+                        }
+
+                        streamed = {}
+                        with st.chat_message("assistant"):
+                            answer_slot = st.empty()
+                            sources_slot = st.container()
+
+                            def show_sources(sources):
+                                with sources_slot:
+                                    render_sources(sources, False, current_doc_context)
+
+                            answer_slot.write_stream(
+                                stream_rag_answer(rag_chain, invoke_payload, streamed, on_sources=show_sources)
+                            )
+                        response = streamed["answer"]
+                        docs = streamed["sources"]
+
+                        used_document = False
+
+                        if not docs and has_document:
+                            with span("attribution") as opened:
+                                attribution = attribute_response_source(
+                                    response,
+                                    current_doc_context,
+                                    get_embeddings(),
+                                    language
+                                )
+                                used_document = attribution["used_document"]
+                                opened.set(used_document=used_document, skipped=attribution.get("skipped"))
+
+                        if not is_follow_up:
+                            answer_cache.store(
                                 prompt,
+                                question_vector,
+                                language,
+                                current_doc_context,
                                 response,
-                                current_doc_context
+                                docs,
+                                used_document,
+                                cache_scope
                             )
 
+                    sources_key = f"sources:{len(st.session_state.messages)}"
+                    previews = build_source_previews(docs, used_document, current_doc_context)
+                    has_sources = previews["document"] or previews["guides"]
                     st.session_state.messages.append({
                         "role": "assistant",
                         "content": response,
-                        "sources_from_guides": docs,
-                        "source_from_document": used_document
+                        "sources_blob": blobs.put_json(session_id, sources_key, previews) if has_sources else None
                     })
 
-                    st.rerun()
+                st.session_state.last_trace = trace.summary()
+                logger.info("Session %s: ~%.0f KB in memory, %.0f KB in the blob store",
+                            session_id[:8], estimate_size(st.session_state.to_dict()) / 1024,
+                            blobs.session_report(session_id)["blob_bytes"] / 1024)
+                st.rerun()
 
-                except Exception as e:
-                    st.error(f"An error occurred during RAG processing: {e}")
+            except GatewayError as e:
+                st.error("Your friend is getting a lot of questions right now. Please try again in a minute.")
+                logger.warning("Chat answer failed after retries: %s", e)
+            except Exception as e:
+                st.error(f"An error occurred during RAG processing: {e}")
+
+    if debug:
+        render_startup_report(STARTUP.report())
+        if st.session_state.last_rerun:
+            st.caption("🔁 Previous rerun: {ms:.0f} ms with {messages} messages ({rendered} rendered)".format(
+                **st.session_state.last_rerun))
+        render_session_memory(estimate_size(st.session_state.to_dict()), blobs.session_report(session_id),
+                              blobs.stats())
+        if st.session_state.last_trace:
+            render_trace_panel(st.session_state.last_trace)
 
     render_disclaimer()
+
+    rerun_seconds = time.perf_counter() - script_start
+    chat_length = len(st.session_state.messages)
+    st.session_state.last_rerun = {"ms": rerun_seconds * 1000, "messages": chat_length,
+                                   "rendered": rendered_messages}
+    registry = get_registry()
+    if registry is not None:
+        bucket = next((edge for edge in CHAT_RENDER_CONFIG["length_buckets"] if chat_length <= edge), "inf")
+        registry.observe("rerun", f"chat_le_{bucket}", rerun_seconds)
@@ -0,0 +1,144 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from embedding_backends import EMBEDDING_BACKENDS, create_embeddings
+from llm_gateway import get_gateway
+from config import ATTRIBUTION_CONFIG, EMBEDDING_DEVICE, EMBEDDING_MODEL
+
+NO_DOCUMENT = "No document uploaded."
+SENTENCE_THRESHOLDS = np.round(np.arange(0.30, 0.901, 0.05), 2)
+SUPPORTED_FRACTIONS = np.round(np.arange(0.1, 0.901, 0.1), 2)
+
+
+def audit_response_source(question, response, document_context):
+    audit_prompt = f"""
+You are an auditor.
+Question: "{question}"
+Answer: "{response}"
+Context: "{document_context}"
+
+Did the "Answer" come *primarily* from the "Context"?
+Respond with ONLY the word 'YES' or 'NO'.
+"""
+    return "YES" in get_gateway().generate_content(audit_prompt, temperature=0.0).text.upper()
+
+
+def load_samples(path, languages):
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            document_context = row.get("document_context") or NO_DOCUMENT
+            if row.get("answer") and document_context != NO_DOCUMENT and row.get("language") in languages:
+                samples.append(row)
+    return samples
+
+
+def label_samples(samples, parallelism):
+    def audit(row):
+        try:
+            return audit_response_source(row.get("question", ""), row["answer"], row["document_context"])
+        except Exception as e:
+            print(f"  ✗ {row.get('id', '?')}: audit failed ({type(e).__name__}: {e})")
+            return None
+
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        return list(pool.map(audit, samples))
+
+
+def supported_fractions(sentence_scores, sentence_threshold):
+    return np.array([np.mean(scores >= sentence_threshold) if len(scores) else 0.0 for scores in sentence_scores])
+
+
+def calibrate(sentence_scores, labels):
+    labels = np.asarray(labels, dtype=bool)
+    results = []
+    for sentence_threshold in SENTENCE_THRESHOLDS:
+        fractions = supported_fractions(sentence_scores, sentence_threshold)
+        for min_supported_fraction in SUPPORTED_FRACTIONS:
+            predicted = fractions >= min_supported_fraction
+            true_positives = int(np.sum(predicted & labels))
+            results.append({
+                "sentence_threshold": float(sentence_threshold),
+                "min_supported_fraction": float(min_supported_fraction),
+                "agreement": float(np.mean(predicted == labels)),
+                "precision": true_positives / max(int(predicted.sum()), 1),
+                "recall": true_positives / max(int(labels.sum()), 1)
+            })
+    return max(results, key=lambda row: (row["agreement"], row["recall"]))
+
+
+def evaluate(sentence_scores, labels, sentence_threshold, min_supported_fraction):
+    predicted = supported_fractions(sentence_scores, sentence_threshold) >= min_supported_fraction
+    return float(np.mean(predicted == np.asarray(labels, dtype=bool)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Calibrate the embedding source-attribution thresholds against the LLM audit they replaced. "
+                    "Reads JSONL rows with 'answer', 'document_context', 'language' and optionally 'question', "
+                    "such as the output of batch_qa.py run over questions about uploaded documents."
+    )
+    parser.add_argument("input", help="JSONL file of answers to label.")
+    parser.add_argument("--output", default=ATTRIBUTION_CONFIG["calibration_path"])
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_DEVICE)
+    parser.add_argument("--parallelism", type=int, default=4, help="Concurrent audit calls.")
+    parser.add_argument("--min-samples", type=int, default=50,
+                        help="Refuse to write a calibration from fewer labeled answers.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if not os.environ.get("GOOGLE_API_KEY"):
+        raise SystemExit("Error: set GOOGLE_API_KEY; the audit labels come from the LLM.")
+
+    languages = ATTRIBUTION_CONFIG["languages"]
+    samples = load_samples(args.input, languages)
+    print(f"[1/3] {len(samples)} answer(s) with a document in {', '.join(languages)}")
+
+    print(f"[2/3] Auditing with the LLM ({args.parallelism} concurrent)...")
+    labels = label_samples(samples, args.parallelism)
+    labeled = [(row, label) for row, label in zip(samples, labels) if label is not None]
+    if len(labeled) < args.min_samples:
+        raise SystemExit(f"Error: only {len(labeled)} labeled answer(s), need at least {args.min_samples}.")
+
+    print("[3/3] Scoring answer sentences against the documents...")
+    from document_processor import score_answer_sentences
+    embeddings = create_embeddings(args.embedding_backend)
+    sentence_scores = [
+        np.array([item["score"] for item in score_answer_sentences(row["answer"], row["document_context"], embeddings)])
+        for row, _ in labeled
+    ]
+    labels = [label for _, label in labeled]
+
+    best = calibrate(sentence_scores, labels)
+    defaults = evaluate(sentence_scores, labels, ATTRIBUTION_CONFIG["sentence_threshold"],
+                        ATTRIBUTION_CONFIG["min_supported_fraction"])
+    print(f"\n✓ {sum(labels)} of {len(labels)} answers came from the document according to the audit")
+    print(f"  Defaults ({ATTRIBUTION_CONFIG['sentence_threshold']}, "
+          f"{ATTRIBUTION_CONFIG['min_supported_fraction']}): {defaults:.1%} agreement")
+    print(f"  Calibrated ({best['sentence_threshold']}, {best['min_supported_fraction']}): "
+          f"{best['agreement']:.1%} agreement, precision {best['precision']:.1%}, recall {best['recall']:.1%}")
+
+    calibration = {
+        **best,
+        "embedding_model": getattr(embeddings, "model_name", EMBEDDING_MODEL),
+        "languages": languages,
+        "samples": len(labels),
+        "positives": int(sum(labels)),
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2)
+    print(f"\n✓ Calibration written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.runnables import RunnableLambda
+from embedding_backends import EMBEDDING_BACKENDS, create_embeddings
+from llm_gateway import GatewayChatModel, GeminiHTTPBackend, LLMGateway
+from rag_pipeline import create_rag_chain
+from retrieval_server import create_server_retriever, document_to_json
+from store_manager import VectorStoreManager
+from config import (
+    BATCH_QA_CONFIG,
+    DATA_PATH,
+    DB_FAISS_PATH,
+    EMBEDDING_DEVICE,
+    LANGUAGES,
+    LLM_GATEWAY_CONFIG,
+    MODEL_NAME
+)
+
+NO_DOCUMENT = "No document uploaded."
+
+
+def load_questions(path, default_language):
+    items, seen, problems = [], set(), []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                problems.append(f"line {line_number}: invalid JSON ({e})")
+                continue
+            item["id"] = str(item.get("id", line_number))
+            item.setdefault("language", default_language)
+            if not str(item.get("question", "")).strip():
+                problems.append(f"line {line_number}: missing 'question'")
+            elif item["language"] not in LANGUAGES:
+                problems.append(f"line {line_number}: unknown language '{item['language']}'")
+            elif item["id"] in seen:
+                problems.append(f"line {line_number}: duplicate id '{item['id']}'")
+            else:
+                seen.add(item["id"])
+                items.append(item)
+    if problems:
+        raise SystemExit(f"Error: {len(problems)} invalid question(s) in '{path}':\n  " + "\n  ".join(problems[:20]))
+    return items
+
+
+def load_checkpoint(path):
+    done, torn = {}, 0
+    if not os.path.exists(path):
+        return done, torn
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                torn += 1
+                continue
+            if "error" not in row:
+                done[row["id"]] = row
+    return done, torn
+
+
+def compact_output(path, items):
+    rows = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            with contextlib.suppress(json.JSONDecodeError):
+                row = json.loads(line)
+                if row["id"] not in rows or "error" not in row or "error" in rows[row["id"]]:
+                    rows[row["id"]] = row
+    order = [item["id"] for item in items if item["id"] in rows]
+    listed = set(order)
+    order += [row_id for row_id in rows if row_id not in listed]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for row_id in order:
+            f.write(json.dumps(rows[row_id], ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+class CheckpointWriter:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, row):
+        line = json.dumps(row, ensure_ascii=False) + "\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+def build_fake_store(data_path, work_dir, embeddings):
+    from ingest import create_vector_db
+
+    db_path = os.path.join(work_dir, "vectorstore")
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_vector_db(data_path=data_path, db_path=db_path, full_rebuild=True, embeddings=embeddings)
+    return db_path
+
+
+def answer_item(chain, item, version, submitted):
+    started = time.perf_counter()
+    payload = {
+        "question": item["question"],
+        "language": item["language"],
+        "chat_history": item.get("chat_history") or "",
+        "document_context": item.get("document_context") or NO_DOCUMENT
+    }
+    result = chain.invoke(payload)
+    return {
+        "answer": result["answer"],
+        "sources": [document_to_json(doc) for doc in result["sources"]],
+        "version": version,
+        "queue_ms": (started - submitted) * 1000,
+        "llm_ms": (time.perf_counter() - started) * 1000
+    }
+
+
+def run_batch(items, output_path, retriever, embeddings, llm, version, batch_size, parallelism):
+    retrieved = {}
+    chain = create_rag_chain(RunnableLambda(lambda question: retrieved[question]), llm)
+    writer = CheckpointWriter(output_path)
+    rows, failures = [], []
+    lock = threading.Lock()
+
+    def finish(item, retrieval, future):
+        if future.cancelled():
+            return
+        row = {**item, **retrieval}
+        try:
+            row.update(future.result())
+            row["latency_ms"] = row["retrieval_ms"] + row["queue_ms"] + row["llm_ms"]
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        writer.write(row)
+        with lock:
+            (failures if "error" in row else rows).append(row)
+
+    pool = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="batch-qa")
+    try:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            started = time.perf_counter()
+            questions = [item["question"] for item in batch]
+            found = retriever.search_batch(questions, embeddings.embed_documents(questions))
+            batch_ms = (time.perf_counter() - started) * 1000
+            retrieved.update(zip(questions, found))
+            retrieval = {"retrieval_ms": batch_ms / len(batch), "retrieval_batch": len(batch)}
+            for item in batch:
+                future = pool.submit(answer_item, chain, item, version, time.perf_counter())
+                future.add_done_callback(lambda done, item=item: finish(item, retrieval, done))
+        pool.shutdown(wait=True)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; waiting for up to {parallelism} LLM call(s) already in flight...")
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        writer.close()
+    return rows, failures
+
+
+def percentiles(samples):
+    if not samples:
+        return "n/a"
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return f"p50 {p50:.0f} ms, p95 {p95:.0f} ms, p99 {p99:.0f} ms"
+
+
+def print_summary(rows, failures, skipped, seconds):
+    print(f"\n✓ Answered {len(rows)} question(s) in {seconds:.1f}s "
+          f"({len(rows) / seconds if seconds else 0:.1f} q/s), resumed past {skipped}, {len(failures)} failed")
+    print(f"  Retrieval (per question): {percentiles([row['retrieval_ms'] for row in rows])}")
+    print(f"  Queue:                    {percentiles([row['queue_ms'] for row in rows])}")
+    print(f"  LLM:                      {percentiles([row['llm_ms'] for row in rows])}")
+    print(f"  End to end:               {percentiles([row['latency_ms'] for row in rows])}")
+    by_language = defaultdict(list)
+    for row in rows:
+        by_language[row["language"]].append(row["latency_ms"])
+    for language in LANGUAGES:
+        if by_language[language]:
+            print(f"    {language:<24} {len(by_language[language]):>5}  {percentiles(by_language[language])}")
+    for row in failures[:5]:
+        print(f"  ✗ {row['id']}: {row['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answer a JSONL file of questions with the RAG chain, for regression-testing prompt and "
+                    "retrieval changes. Each input line needs a 'question' and may set 'id', 'language', "
+                    "'chat_history' and 'document_context'."
+    )
+    parser.add_argument("input", help="JSONL file with one question per line.")
+    parser.add_argument("output", help="JSONL file for answers. Re-running with the same output resumes the run.")
+    parser.add_argument("--db", default=DB_FAISS_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_QA_CONFIG["batch_size"],
+                        help="Questions embedded and searched together.")
+    parser.add_argument("--parallelism", type=int, default=BATCH_QA_CONFIG["parallelism"],
+                        help="Maximum concurrent LLM calls.")
+    parser.add_argument("--requests-per-minute", type=float, default=LLM_GATEWAY_CONFIG["requests_per_minute"])
+    parser.add_argument("--temperature", type=float, default=BATCH_QA_CONFIG["temperature"])
+    parser.add_argument("--language", choices=LANGUAGES, default=BATCH_QA_CONFIG["default_language"],
+                        help="Language for lines that do not set one.")
+    parser.add_argument("--limit", type=int, help="Only answer the first N questions.")
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_DEVICE)
+    parser.add_argument("--fake", action="store_true",
+                        help="Answer from a local fake Gemini server instead of the API. Retrieval still uses "
+                             "--embedding-backend and --db.")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Fake LLM latency for --fake runs.")
+    parser.add_argument("--hashing-embeddings", action="store_true",
+                        help="Use hashing embeddings and a temporary store built from --data instead of --db.")
+    parser.add_argument("--data", default=DATA_PATH, help="Guides to index for --hashing-embeddings runs.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    items = load_questions(args.input, args.language)[:args.limit]
+    done, torn = load_checkpoint(args.output)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"[1/4] {len(items)} question(s) in {args.input}: {len(items) - len(pending)} already answered, "
+          f"{len(pending)} to go" + (f" ({torn} torn line(s) ignored)" if torn else ""))
+    if not pending:
+        compact_output(args.output, items)
+        print(f"✓ Nothing to do, {args.output} is complete")
+        return 0
+
+    with contextlib.ExitStack() as stack:
+        if args.fake:
+            from fakes import FakeGeminiServer
+            server = stack.enter_context(FakeGeminiServer(latency_s=args.llm_latency_ms / 1000))
+            backend = GeminiHTTPBackend(server.url, "fake", LLM_GATEWAY_CONFIG["timeout_s"])
+            requests_per_minute, burst = 10 ** 9, 10 ** 6
+        else:
+            api_key = os.environ.get("GOOGLE_API_KEY")
+            if not api_key:
+                raise SystemExit("Error: set GOOGLE_API_KEY, or pass --fake for an offline run.")
+            backend = GeminiHTTPBackend(LLM_GATEWAY_CONFIG["base_url"], api_key, LLM_GATEWAY_CONFIG["timeout_s"])
+            requests_per_minute, burst = args.requests_per_minute, LLM_GATEWAY_CONFIG["burst"]
+
+        if args.hashing_embeddings:
+            from fakes import HashingEmbeddings
+            print("[2/4] Indexing the guides with hashing embeddings...")
+            embeddings = HashingEmbeddings()
+            db_path = build_fake_store(args.data, stack.enter_context(tempfile.TemporaryDirectory()), embeddings)
+        else:
+            print("[2/4] Loading the embedding model...")
+            embeddings = create_embeddings(args.embedding_backend)
+            db_path = args.db
+
+        print("[3/4] Loading vector store...")
+        try:
+            manager = VectorStoreManager(db_path, embeddings, create_server_retriever)
+        except Exception as e:
+            raise SystemExit(f"Error loading vector store: {e}. Did you run 'ingest.py'?")
+        gateway = LLMGateway(backend, requests_per_minute=requests_per_minute, burst=burst,
+                             max_in_flight=args.parallelism)
+        stack.callback(gateway.close)
+        llm = GatewayChatModel(model_name=MODEL_NAME, temperature=args.temperature, gateway=gateway)
+        snapshot = stack.enter_context(manager.lease())
+
+        print(f"[4/4] Answering with store version {snapshot.version or 'unversioned'}, batches of "
+              f"{args.batch_size}, up to {args.parallelism} concurrent LLM call(s)...")
+        start = time.perf_counter()
+        try:
+            rows, failures = run_batch(pending, args.output, snapshot.retriever, embeddings, llm,
+                                       snapshot.version, args.batch_size, args.parallelism)
+        except KeyboardInterrupt:
+            print(f"\n✗ Interrupted. Finished answers are saved in {args.output}; "
+                  "run the same command again to resume.")
+            return 130
+        seconds = time.perf_counter() - start
+
+    compact_output(args.output, items)
+    print_summary(rows, failures, len(items) - len(pending), seconds)
+    print(f"\n✓ Answers written to {args.output}")
+    if failures:
+        print(f"✗ {len(failures)} question(s) failed; run the same command again to retry them.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
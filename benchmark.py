@@ -0,0 +1,642 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+CHUNKS_PER_FILE = 1000
+REGRESSION_THRESHOLD = 0.10
+COMPARED_SECTIONS = ("sizes", "documents", "gateway", "chat")
+SKIPPED_METRICS = ("chunks", "bytes", "size", "quality", "requests", "succeeded", "calls", "errors",
+                   "coalesced", "retries", "failures", "mean_batch", "rendered")
+CHAT_LENGTHS = [10, 100, 400]
+
+TOPICS = [
+    ("arrest", "the police", "an arrested person", "Section 41 of the CrPC"),
+    ("bail", "the magistrate", "the accused", "Section 437 of the CrPC"),
+    ("consumer", "the seller", "a consumer", "Section 35 of the Consumer Protection Act"),
+    ("tenancy", "the landlord", "a tenant", "Section 106 of the Transfer of Property Act"),
+    ("cruelty", "the husband", "a married woman", "Section 498-A of the IPC"),
+    ("cheating", "the accused", "the victim", "Section 420 of the IPC"),
+    ("wages", "the employer", "a worker", "Section 15 of the Payment of Wages Act"),
+    ("information", "the public authority", "a citizen", "Section 6 of the RTI Act")
+]
+
+SENTENCES = [
+    "Under {law}, {actor} must inform {person} about the {topic} matter within {days} days.",
+    "{person_cap} has the right to ask {actor} for a written copy of every {topic} order.",
+    "If {actor} refuses, {person} may approach the District Legal Services Authority for free help.",
+    "Courts have held that {topic} cases involving {person} should be decided within {days} days.",
+    "A complaint about {topic} can be filed by {person} with supporting documents and {days} copies.",
+    "{actor_cap} cannot demand money from {person} for any step described in {law}.",
+    "The penalty for violating {law} can include a fine of Rs. {fine} and imprisonment.",
+    "Legal aid lawyers often advise {person} to keep a diary of every {topic} related event."
+]
+
+QUESTIONS = [
+    "What are my rights as {person} in a {topic} case?",
+    "What does {law} say about {topic}?",
+    "Can {actor} ask me for money in a {topic} matter?",
+    "How many days does {actor} have to respond about {topic}?",
+    "Where can {person} get free legal help for {topic}?"
+]
+
+
+def _fill(template, rng):
+    topic, actor, person, law = rng.choice(TOPICS)
+    return template.format(
+        topic=topic, actor=actor, person=person, law=law,
+        actor_cap=actor[0].upper() + actor[1:], person_cap=person[0].upper() + person[1:],
+        days=rng.choice([7, 15, 30, 60, 90]), fine=rng.choice([500, 1000, 5000, 10000, 50000])
+    )
+
+
+def synthetic_paragraph(rng, min_chars=300, max_chars=480):
+    paragraph = ""
+    while len(paragraph) < min_chars:
+        paragraph += _fill(rng.choice(SENTENCES), rng) + " "
+    return paragraph[:max_chars].rsplit(" ", 1)[0]
+
+
+def synthetic_questions(num_questions, seed):
+    rng = random.Random(seed + 1)
+    return [_fill(rng.choice(QUESTIONS), rng) for _ in range(num_questions)]
+
+
+def write_corpus(data_path, num_chunks, seed):
+    rng = random.Random(seed)
+    os.makedirs(data_path, exist_ok=True)
+    written = 0
+    for file_number in range((num_chunks + CHUNKS_PER_FILE - 1) // CHUNKS_PER_FILE):
+        count = min(CHUNKS_PER_FILE, num_chunks - written)
+        with open(os.path.join(data_path, f"guide_{file_number:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(synthetic_paragraph(rng) for _ in range(count)))
+        written += count
+
+
+def latency_stats(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "mean_ms": float(samples.mean())
+    }
+
+
+def concurrent_latencies(call, inputs, clients):
+    def timed(item):
+        start = time.perf_counter()
+        call(item)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        latencies = list(pool.map(timed, inputs))
+    return {**latency_stats(latencies), "queries_per_sec": len(inputs) / (time.perf_counter() - start)}
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+
+def directory_mb(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names) / (1024 * 1024)
+
+
+def check_incremental_edit(args):
+    import sqlite3
+    from config import DOCSTORE_FILE
+    from fakes import HashingEmbeddings
+    from ingest import create_vector_db
+    from vector_store import current_version
+
+    path = os.path.join(args.data, sorted(name for name in os.listdir(args.data) if name.endswith(".txt"))[0])
+    with open(path, "r", encoding="utf-8") as f:
+        paragraphs = f.read().split("\n\n")
+    words = paragraphs[0].split(" ")
+    words[len(words) // 2] = "amended"
+    paragraphs[0] = " ".join(words)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs))
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO() if args.quiet else sys.stdout):
+        create_vector_db(data_path=args.data, db_path=args.db, index_type=args.index_type,
+                         batch_size=args.batch_size, workers=args.workers, embeddings=HashingEmbeddings())
+    seconds = time.perf_counter() - start
+
+    _, store_path = current_version(args.db)
+    conn = sqlite3.connect(os.path.join(store_path, DOCSTORE_FILE))
+    try:
+        stored = conn.execute("SELECT 1 FROM chunks WHERE page_content = ?", (paragraphs[0],)).fetchone()
+    finally:
+        conn.close()
+    if not stored:
+        raise RuntimeError(f"Incremental ingest did not store the edited chunk of {os.path.basename(path)}")
+    return seconds
+
+
+def bench_ingest(args):
+    from fakes import HashingEmbeddings
+    from ingest import create_vector_db
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO() if args.quiet else sys.stdout):
+        create_vector_db(
+            data_path=args.data,
+            db_path=args.db,
+            full_rebuild=True,
+            index_type=args.index_type,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            embeddings=HashingEmbeddings()
+        )
+    seconds = time.perf_counter() - start
+
+    from config import MANIFEST_FILE
+    from vector_store import current_version
+    _, store_path = current_version(args.db)
+    with open(os.path.join(store_path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    chunks = sum(len(entry["chunk_ids"]) for entry in manifest["files"].values())
+    store_mb = directory_mb(store_path)
+    return {
+        "chunks": chunks,
+        "seconds": seconds,
+        "chunks_per_sec": chunks / seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "store_mb": store_mb,
+        "effective_index": manifest["effective_index"],
+        "incremental_edit_seconds": check_incremental_edit(args)
+    }
+
+
+def bench_serve(args):
+    start = time.perf_counter()
+    from fakes import HashingEmbeddings
+    from llm_gateway import GatewayChatModel
+    from lexical_index import LexicalIndex, has_lexical_index
+    from rag_pipeline import create_rag_chain, create_retriever, stream_rag_answer
+    from vector_store import current_version, load_vector_store
+    import_seconds = time.perf_counter() - start
+    warnings.filterwarnings("ignore", message="Relevance scores must be between 0 and 1")
+    rss_before_load = current_rss_mb()
+
+    start = time.perf_counter()
+    _, store_path = current_version(args.db)
+    db = load_vector_store(store_path, HashingEmbeddings())
+    lexical_index = LexicalIndex(store_path) if has_lexical_index(store_path) else None
+    load_seconds = time.perf_counter() - start
+    rss_after_load = current_rss_mb()
+
+    retriever = create_retriever(db, lexical_index)
+    questions = synthetic_questions(args.num_queries, args.seed)
+
+    start = time.perf_counter()
+    retriever.invoke(questions[0])
+    first_query_ms = (time.perf_counter() - start) * 1000
+
+    retrieval, dense, lexical = [], [], []
+    for question in questions:
+        start = time.perf_counter()
+        retriever.invoke(question)
+        retrieval.append(time.perf_counter() - start)
+        if hasattr(retriever, "dense_search"):
+            start = time.perf_counter()
+            retriever.dense_search(question)
+            dense.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            retriever.lexical_search(question)
+            lexical.append(time.perf_counter() - start)
+
+    from retrieval_client import RemoteRetriever, RetrievalClient
+    from retrieval_server import RetrievalService, create_server, create_server_retriever
+    from store_manager import VectorStoreManager
+    embeddings = HashingEmbeddings()
+    service = RetrievalService(VectorStoreManager(args.db, embeddings, create_server_retriever), embeddings)
+    retrieval_server = create_server(service, socket_path=os.path.join(os.path.dirname(args.db), "retrieval.sock"))
+    threading.Thread(target=retrieval_server.serve_forever, daemon=True).start()
+    remote = RemoteRetriever(client=RetrievalClient(socket_path=retrieval_server.server_address),
+                             fallback=lambda: retriever)
+    concurrent = {
+        "in_process": concurrent_latencies(retriever.invoke, questions, args.clients),
+        "server": concurrent_latencies(remote.invoke, questions, args.clients)
+    }
+    concurrent["server"]["mean_batch"] = service.batcher.stats["items"] / max(service.batcher.stats["batches"], 1)
+    retrieval_server.shutdown()
+    retrieval_server.server_close()
+
+    server = fake_server(args).start()
+    gateway = unthrottled_gateway(server)
+    chain = create_rag_chain(retriever, GatewayChatModel(gateway=gateway))
+    invoke, stream, ttft = [], [], []
+    for question in questions[:args.num_chain_queries]:
+        payload = {
+            "question": question,
+            "language": "English",
+            "chat_history": "",
+            "document_context": "No document uploaded."
+        }
+        start = time.perf_counter()
+        chain.invoke(payload)
+        invoke.append(time.perf_counter() - start)
+
+        result = {}
+        start = time.perf_counter()
+        for _ in stream_rag_answer(chain, payload, result):
+            pass
+        stream.append(time.perf_counter() - start)
+        ttft.append(result["ttft_ms"] / 1000)
+    gateway.close()
+    server.close()
+
+    return {
+        "import_seconds": import_seconds,
+        "load_seconds": load_seconds,
+        "rss_before_load_mb": rss_before_load,
+        "rss_after_load_mb": rss_after_load,
+        "peak_rss_mb": peak_rss_mb(),
+        "first_query_ms": first_query_ms,
+        "retrieval": latency_stats(retrieval),
+        "dense_search": latency_stats(dense) if dense else None,
+        "lexical_search": latency_stats(lexical) if lexical else None,
+        "concurrent_retrieval": concurrent,
+        "chain_invoke": latency_stats(invoke),
+        "chain_stream": latency_stats(stream),
+        "chain_ttft": latency_stats(ttft)
+    }
+
+
+def fake_server(args, **overrides):
+    from fakes import FakeGeminiServer
+    settings = {"latency_s": args.llm_latency_ms / 1000, "token_delay_s": args.llm_token_delay_ms / 1000,
+                "seed": args.seed, **overrides}
+    return FakeGeminiServer(**settings)
+
+
+def unthrottled_gateway(server, **overrides):
+    from llm_gateway import GeminiHTTPBackend, LLMGateway
+    settings = {"requests_per_minute": 10 ** 9, "burst": 10 ** 6, **overrides}
+    return LLMGateway(GeminiHTTPBackend(server.url, "benchmark", timeout_s=30), **settings)
+
+
+def bench_gateway(args):
+    from concurrent.futures import ThreadPoolExecutor
+    from llm_gateway import GatewayError, build_request
+
+    results = {}
+    scenarios = {
+        "coalescing": ({"latency_s": max(args.llm_latency_ms / 1000, 0.2)}, {}, 8),
+        "errors": ({"error_rate": 0.3, "error_status": 503}, {"base_delay_s": 0.01, "max_delay_s": 0.1}, 64),
+        "rate_limited": ({}, {"requests_per_minute": 600, "burst": 5}, 32)
+    }
+    for name, (server_settings, gateway_settings, distinct) in scenarios.items():
+        with fake_server(args, **server_settings) as server:
+            gateway = unthrottled_gateway(server, max_in_flight=8, **gateway_settings)
+            requests = [build_request(f"NEW QUESTION: benchmark question {i % distinct}") for i in range(64)]
+
+            def call(request):
+                start = time.perf_counter()
+                try:
+                    gateway.generate(request)
+                    return time.perf_counter() - start, True
+                except GatewayError:
+                    return time.perf_counter() - start, False
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=32) as pool:
+                outcomes = list(pool.map(call, requests))
+            results[name] = {
+                "seconds": time.perf_counter() - start,
+                "requests": len(requests),
+                "succeeded": sum(ok for _, ok in outcomes),
+                "server_calls": server.calls,
+                "injected_errors": server.errors,
+                **gateway.stats,
+                "latency": latency_stats([elapsed for elapsed, _ in outcomes])
+            }
+            gateway.close()
+    return results
+
+
+def bench_documents(args):
+    from unittest import mock
+    from PIL import Image
+    import document_processor
+    from document_cache import DocumentCache
+    from llm_gateway import configure_gateway
+
+    rng = np.random.default_rng(args.seed)
+    image = Image.fromarray(rng.integers(0, 255, (3000, 2200, 3), dtype=np.uint8))
+    raw = io.BytesIO()
+    image.save(raw, format="PNG")
+    upload = raw.getvalue()
+
+    start = time.perf_counter()
+    image_bytes, stats = document_processor.preprocess_image("benchmark", upload)
+    preprocess_seconds = time.perf_counter() - start
+
+    cache = DocumentCache(os.path.join(args.db, "documents.sqlite3"), max_bytes=64 * 1024 * 1024)
+    timings = {}
+    with fake_server(args) as server, mock.patch.object(document_processor, "get_document_cache", lambda: cache):
+        configure_gateway(api_key="benchmark", base_url=server.url)
+        for label in ("cold", "warm"):
+            start = time.perf_counter()
+            explanation, _ = document_processor.extract_and_explain_document(image_bytes, "image/jpeg", "English")
+            timings[label] = time.perf_counter() - start
+            if explanation is None:
+                raise RuntimeError("Document pipeline returned no explanation.")
+
+    return {
+        "upload_bytes": len(upload),
+        "preprocessed_bytes": len(image_bytes),
+        "preprocess_ms": preprocess_seconds * 1000,
+        "preprocess_stats": stats,
+        "extract_and_explain_cold_ms": timings["cold"] * 1000,
+        "extract_and_explain_warm_ms": timings["warm"] * 1000
+    }
+
+
+def bench_chat(args):
+    import logging
+    from statistics import median
+    from unittest import mock
+    logging.basicConfig(level=logging.WARNING)
+    import config
+    config.BLOB_STORE_CONFIG["path"] = os.path.join(args.db, "blobs")
+    from langchain_core.documents import Document
+    from streamlit.testing.v1 import AppTest
+    from blob_store import get_blob_store
+    from startup import STARTUP
+    from ui_components import build_source_previews
+
+    rng = random.Random(args.seed)
+    store = get_blob_store()
+    results = {}
+    with mock.patch.object(STARTUP, "start_warmup", lambda *a, **k: None):
+        for length in CHAT_LENGTHS:
+            session_id = f"benchmark-{length}"
+            messages = []
+            for i in range(length):
+                if i % 2 == 0:
+                    messages.append({"role": "user", "content": synthetic_questions(1, args.seed + i)[0]})
+                    continue
+                docs = [Document(page_content=synthetic_paragraph(rng), metadata={"source": f"guide_{j}.txt"})
+                        for j in range(3)]
+                previews = build_source_previews(docs, False, "")
+                messages.append({"role": "assistant", "content": "\n".join(synthetic_paragraph(rng) for _ in range(2)),
+                                 "sources_blob": store.put_json(session_id, f"sources:{i}", previews)})
+
+            app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"),
+                                    default_timeout=120)
+            app.secrets["GOOGLE_API_KEY"] = "benchmark"
+            app.session_state.app_started = True
+            app.session_state.session_id = session_id
+            app.session_state.messages = messages
+            app.run()
+            row = {}
+            for label, visible in (("paginated", None), ("expanded", length)):
+                if visible:
+                    app.session_state.chat_visible = visible
+                    app.run()
+                samples = []
+                for _ in range(5):
+                    app.run()
+                    samples.append(app.session_state.last_rerun["ms"])
+                row[f"{label}_rerun_ms"] = median(samples)
+                row[f"{label}_rendered"] = app.session_state.last_rerun["rendered"]
+            results[str(length)] = row
+    return results
+
+
+WORKER_TASKS = {
+    "ingest": bench_ingest,
+    "serve": bench_serve,
+    "documents": bench_documents,
+    "gateway": bench_gateway,
+    "chat": bench_chat
+}
+
+
+def run_worker(task, args, **paths):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_path = f.name
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker", task, "--result", result_path,
+        "--seed", str(args.seed), "--num-queries", str(args.num_queries),
+        "--num-chain-queries", str(args.num_chain_queries), "--batch-size", str(args.batch_size),
+        "--clients", str(args.clients),
+        "--llm-latency-ms", str(args.llm_latency_ms), "--llm-token-delay-ms", str(args.llm_token_delay_ms)
+    ]
+    if args.index_type:
+        command += ["--index-type", args.index_type]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    if not args.verbose:
+        command.append("--quiet")
+    for name, value in paths.items():
+        command += [f"--{name}", value]
+
+    try:
+        subprocess.run(command, check=True, stdout=None if args.verbose else subprocess.DEVNULL)
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                capture_output=True, text=True, check=True)
+        return commit.stdout.strip(), bool(status.stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def run_benchmark(args):
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "sizes": args.sizes,
+            "index_type": args.index_type,
+            "num_queries": args.num_queries,
+            "num_chain_queries": args.num_chain_queries,
+            "batch_size": args.batch_size,
+            "workers": args.workers,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_token_delay_ms": args.llm_token_delay_ms,
+            "seed": args.seed
+        },
+        "sizes": {}
+    }
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="nyay-bench-")
+    try:
+        for size in args.sizes:
+            data_path = os.path.join(work_dir, f"data_{size}")
+            db_path = os.path.join(work_dir, f"db_{size}")
+            print(f"\n[{size} chunks] Generating corpus...")
+            start = time.perf_counter()
+            write_corpus(data_path, size, args.seed)
+            print(f"✓ Corpus written in {time.perf_counter() - start:.1f}s")
+
+            ingest = run_worker("ingest", args, data=data_path, db=db_path)
+            print(f"✓ Ingest: {ingest['chunks']} chunks in {ingest['seconds']:.1f}s "
+                  f"({ingest['chunks_per_sec']:.0f} chunks/sec, peak RSS {ingest['peak_rss_mb']:.0f} MB)")
+
+            serve = run_worker("serve", args, db=db_path)
+            print(f"✓ Cold load: {serve['load_seconds'] * 1000:.0f} ms, "
+                  f"RSS {serve['rss_before_load_mb']:.0f} -> {serve['rss_after_load_mb']:.0f} MB")
+            print(f"✓ Retrieval: p50 {serve['retrieval']['p50_ms']:.2f} ms, "
+                  f"p99 {serve['retrieval']['p99_ms']:.2f} ms")
+            concurrent = serve["concurrent_retrieval"]
+            print(f"✓ {args.clients} concurrent clients: in-process {concurrent['in_process']['queries_per_sec']:.0f} q/s, "
+                  f"server {concurrent['server']['queries_per_sec']:.0f} q/s "
+                  f"(mean batch {concurrent['server']['mean_batch']:.1f})")
+            print(f"✓ Chain: invoke p50 {serve['chain_invoke']['p50_ms']:.1f} ms, "
+                  f"TTFT p50 {serve['chain_ttft']['p50_ms']:.1f} ms")
+            report["sizes"][str(size)] = {"ingest": ingest, "serve": serve}
+            shutil.rmtree(data_path, ignore_errors=True)
+            shutil.rmtree(db_path, ignore_errors=True)
+
+        print("\n[documents] Running Samjhao pipeline with a fake Gemini model...")
+        report["documents"] = run_worker("documents", args, db=work_dir)
+        print(f"✓ Extract + explain: cold {report['documents']['extract_and_explain_cold_ms']:.1f} ms, "
+              f"warm {report['documents']['extract_and_explain_warm_ms']:.1f} ms")
+
+        print("\n[chat] Rerunning the app with long chats...")
+        report["chat"] = run_worker("chat", args, db=work_dir)
+        for length, row in report["chat"].items():
+            print(f"✓ {length} messages: rerun {row['paginated_rerun_ms']:.0f} ms with "
+                  f"{row['paginated_rendered']} shown, {row['expanded_rerun_ms']:.0f} ms with all shown")
+
+        print("\n[gateway] Running the LLM gateway against a fake Gemini server...")
+        report["gateway"] = run_worker("gateway", args)
+        for name, row in report["gateway"].items():
+            print(f"✓ {name}: {row['succeeded']}/{row['requests']} succeeded in {row['seconds']:.2f}s, "
+                  f"{row['server_calls']} server calls, {row['coalesced']} coalesced, {row['retries']} retries")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join("benchmarks", f"{(commit or 'local')[:12]}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Results written to {output}")
+
+
+def flatten_metrics(node, prefix=""):
+    metrics = {}
+    for name, value in node.items():
+        key = f"{prefix}.{name}" if prefix else name
+        if isinstance(value, dict):
+            metrics.update(flatten_metrics(value, key))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[key] = float(value)
+    return metrics
+
+
+def compare_reports(old_path, new_path, threshold):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    old_metrics = flatten_metrics({name: old.get(name, {}) for name in COMPARED_SECTIONS})
+    new_metrics = flatten_metrics({name: new.get(name, {}) for name in COMPARED_SECTIONS})
+    print(f"Comparing {(old['commit'] or 'local')[:12]} -> {(new['commit'] or 'local')[:12]}")
+    print(f"\n{'metric':<60} {'old':>12} {'new':>12} {'change':>8}")
+    regressions = []
+    for key in sorted(old_metrics.keys() & new_metrics.keys()):
+        before, after = old_metrics[key], new_metrics[key]
+        if not before or any(part in key for part in SKIPPED_METRICS):
+            continue
+        change = (after - before) / before
+        worse = -change if key.endswith("per_sec") else change
+        flag = " !" if worse > threshold else ""
+        if flag:
+            regressions.append(key)
+        print(f"{key:<60} {before:>12.2f} {after:>12.2f} {change:>+7.1%}{flag}")
+
+    print(f"\n{len(regressions)} metrics regressed by more than {threshold:.0%}")
+    return not regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark for ingest, vector store loading, retrieval and the RAG chain. "
+                    "Uses synthetic guides, hashing embeddings and a fake LLM, so no network is needed."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Corpus sizes in chunks (e.g. 1000 10000 100000 1000000).")
+    parser.add_argument("--index-type", default=None, help="FAISS index type passed to ingest.py.")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--num-chain-queries", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--clients", type=int, default=8,
+                        help="Concurrent clients when comparing in-process and server retrieval.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="Simulated model latency before the first token.")
+    parser.add_argument("--llm-token-delay-ms", type=float, default=0.0,
+                        help="Simulated delay between streamed tokens.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Keep generated corpora and stores here instead of a temp dir.")
+    parser.add_argument("--output", help="JSON results path (default: benchmarks/<commit>.json).")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two result files instead of running the benchmark.")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative change reported as a regression by --compare.")
+    parser.add_argument("--verbose", action="store_true", help="Show ingest output from the workers.")
+    parser.add_argument("--worker", choices=WORKER_TASKS, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--quiet", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = WORKER_TASKS[args.worker](args)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+    elif args.compare:
+        sys.exit(0 if compare_reports(*args.compare, args.threshold) else 1)
+    else:
+        run_benchmark(args)
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import streamlit as st
+from langchain_core.documents import Document
+from document_cache import hash_bytes
+from tracing import get_registry
+from config import BLOB_STORE_CONFIG
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    blob_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refs (
+    session_id TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    blob_hash TEXT NOT NULL,
+    PRIMARY KEY (session_id, slot)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_blob_hash ON refs (blob_hash);
+CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen);
+"""
+
+
+def estimate_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(estimate_size(item) for item in value)
+    if isinstance(value, Document):
+        return len(value.page_content) + estimate_size(value.metadata)
+    index = getattr(value, "index", None)
+    if index is not None and hasattr(index, "ntotal"):
+        docs = getattr(getattr(value, "docstore", None), "_dict", {})
+        return index.ntotal * index.d * 4 + sum(estimate_size(doc) for doc in docs.values())
+    return 8
+
+
+class BlobStore:
+    def __init__(self, path, max_bytes, memory_bytes, idle_seconds, sweep_interval_s):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.idle_seconds = idle_seconds
+        self.sweep_interval_s = sweep_interval_s
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        os.makedirs(path, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.path, "blobs.sqlite3"), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _blob_path(self, blob_hash):
+        return os.path.join(self.path, blob_hash[:2], blob_hash)
+
+    def _remember(self, blob_hash, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            if blob_hash in self._memory:
+                self._memory.move_to_end(blob_hash)
+                return
+            self._memory[blob_hash] = data
+            self._memory_used += len(data)
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+
+    def _forget(self, blob_hash):
+        with self._lock:
+            data = self._memory.pop(blob_hash, None)
+            if data is not None:
+                self._memory_used -= len(data)
+
+    def put(self, session_id, slot, data):
+        blob_hash = hash_bytes(data)
+        path = self._blob_path(blob_hash)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            conn.execute("INSERT OR IGNORE INTO blobs (blob_hash, size) VALUES (?, ?)", (blob_hash, len(data)))
+            previous = conn.execute(
+                "SELECT blob_hash FROM refs WHERE session_id = ? AND slot = ?", (session_id, slot)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO refs (session_id, slot, blob_hash) VALUES (?, ?, ?)",
+                (session_id, slot, blob_hash)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, last_seen) VALUES (?, ?)", (session_id, time.time())
+            )
+            if previous and previous[0] != blob_hash:
+                self._collect(conn, [previous[0]])
+            self._enforce_cap(conn, session_id)
+        self._remember(blob_hash, data)
+        return blob_hash
+
+    def put_text(self, session_id, slot, text):
+        return self.put(session_id, slot, text.encode("utf-8"))
+
+    def put_json(self, session_id, slot, value):
+        return self.put(session_id, slot, json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+    def get(self, blob_hash):
+        with self._lock:
+            data = self._memory.get(blob_hash)
+            if data is not None:
+                self._memory.move_to_end(blob_hash)
+                return data
+        try:
+            with open(self._blob_path(blob_hash), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        self._remember(blob_hash, data)
+        return data
+
+    def get_text(self, blob_hash):
+        data = self.get(blob_hash)
+        return data.decode("utf-8") if data is not None else None
+
+    def get_json(self, blob_hash):
+        data = self.get(blob_hash)
+        return json.loads(data) if data is not None else None
+
+    def release(self, session_id, slot=None, prefix=None):
+        query, params = "FROM refs WHERE session_id = ?", [session_id]
+        if slot is not None:
+            query, params = query + " AND slot = ?", params + [slot]
+        if prefix is not None:
+            query, params = query + " AND substr(slot, 1, ?) = ?", params + [len(prefix), prefix]
+        with self._connect() as conn:
+            hashes = [row[0] for row in conn.execute(f"SELECT blob_hash {query}", params)]
+            conn.execute(f"DELETE {query}", params)
+            self._collect(conn, hashes)
+
+    def _collect(self, conn, hashes):
+        freed = 0
+        for blob_hash in set(hashes):
+            if conn.execute("SELECT 1 FROM refs WHERE blob_hash = ? LIMIT 1", (blob_hash,)).fetchone():
+                continue
+            row = conn.execute("SELECT size FROM blobs WHERE blob_hash = ?", (blob_hash,)).fetchone()
+            conn.execute("DELETE FROM blobs WHERE blob_hash = ?", (blob_hash,))
+            try:
+                os.remove(self._blob_path(blob_hash))
+            except FileNotFoundError:
+                pass
+            self._forget(blob_hash)
+            freed += row[0] if row else 0
+        return freed
+
+    def _drop_sessions(self, conn, session_ids):
+        hashes = []
+        for session_id in session_ids:
+            hashes += [row[0] for row in conn.execute("SELECT blob_hash FROM refs WHERE session_id = ?",
+                                                      (session_id,))]
+            conn.execute("DELETE FROM refs WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return self._collect(conn, hashes)
+
+    def _evicted(self, reason, sessions, freed):
+        logger.info("Evicted %d %s session(s) from the blob store, freed %.1f MB", sessions, reason, freed / 2 ** 20)
+        registry = get_registry()
+        if registry:
+            registry.add("nyay_blob_evictions_total", (("reason", reason),), sessions)
+
+    def _enforce_cap(self, conn, keep_session_id):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        oldest = conn.execute(
+            "SELECT session_id FROM sessions WHERE session_id != ? ORDER BY last_seen ASC", (keep_session_id,)
+        ).fetchall()
+        evicted, freed = 0, 0
+        for (session_id,) in oldest:
+            if total - freed <= self.max_bytes:
+                break
+            freed += self._drop_sessions(conn, [session_id])
+            evicted += 1
+        if evicted:
+            self._evicted("over_cap", evicted, freed)
+        if total - freed > self.max_bytes:
+            logger.warning("Blob store holds %.1f MB, over its %.1f MB cap, for the active session alone",
+                           (total - freed) / 2 ** 20, self.max_bytes / 2 ** 20)
+
+    def touch(self, session_id):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE sessions SET last_seen = ? WHERE session_id = ?", (now, session_id))
+        if now - self._last_sweep >= self.sweep_interval_s:
+            self._last_sweep = now
+            self.evict_idle()
+
+    def evict_idle(self, idle_seconds=None):
+        cutoff = time.time() - (self.idle_seconds if idle_seconds is None else idle_seconds)
+        with self._connect() as conn:
+            idle = [row[0] for row in conn.execute("SELECT session_id FROM sessions WHERE last_seen < ?", (cutoff,))]
+            freed = self._drop_sessions(conn, idle)
+        if idle:
+            self._evicted("idle", len(idle), freed)
+        return len(idle)
+
+    def session_report(self, session_id):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT refs.slot, refs.blob_hash, blobs.size, "
+                "(SELECT COUNT(*) FROM refs AS other WHERE other.blob_hash = refs.blob_hash) "
+                "FROM refs JOIN blobs ON blobs.blob_hash = refs.blob_hash WHERE refs.session_id = ? "
+                "ORDER BY refs.slot", (session_id,)
+            ).fetchall()
+        with self._lock:
+            cached = {blob_hash for _, blob_hash, _, _ in rows if blob_hash in self._memory}
+        return {
+            "slots": [{"slot": slot, "hash": blob_hash[:12], "bytes": size, "refs": refs}
+                      for slot, blob_hash, size, refs in rows],
+            "blob_bytes": sum(size for _, _, size, _ in rows),
+            "shared_bytes": sum(size for _, _, size, refs in rows if refs > 1),
+            "memory_cached_bytes": sum(size for _, blob_hash, size, _ in rows if blob_hash in cached)
+        }
+
+    def stats(self):
+        with self._connect() as conn:
+            blobs, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            sessions = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        with self._lock:
+            memory_used = self._memory_used
+        return {"blobs": blobs, "disk_bytes": total, "sessions": sessions, "memory_bytes": memory_used,
+                "max_bytes": self.max_bytes, "max_memory_bytes": self.memory_bytes}
+
+
+@st.cache_resource
+def get_blob_store():
+    return BlobStore(**BLOB_STORE_CONFIG)
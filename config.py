@@ -1,5 +1,10 @@
 DATA_PATH = "data/"
 DB_FAISS_PATH = "vectorstores/db_faiss"
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite3"
+MANIFEST_FILE = "manifest.json"
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
 MODEL_NAME = "gemini-2.5-flash"
 
 RAG_CONFIG = {
@@ -10,17 +15,164 @@ RAG_CONFIG = {
     }
 }
 
+HYBRID_SEARCH_CONFIG = {
+    "enabled": True,
+    "fetch_k": 20,
+    "rrf_k": 60,
+    "min_lexical_score": 1.0
+}
+
+ANSWER_CACHE_CONFIG = {
+    "path": "cache/answers.sqlite3",
+    "similarity_threshold": 0.92,
+    "ttl_seconds": 7 * 24 * 60 * 60,
+    "max_entries": 5000
+}
+
+DOCUMENT_CACHE_CONFIG = {
+    "path": "cache/documents.sqlite3",
+    "max_bytes": 256 * 1024 * 1024
+}
+
+BLOB_STORE_CONFIG = {
+    "path": "cache/blobs",
+    "max_bytes": 1024 * 1024 * 1024,
+    "memory_bytes": 64 * 1024 * 1024,
+    "idle_seconds": 60 * 60,
+    "sweep_interval_s": 60
+}
+
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 EMBEDDING_DEVICE = "cpu"
 
+EMBEDDING_BACKEND_CONFIG = {
+    "threads": None,
+    "batch_size": 32,
+    "onnx_int8_file": "onnx/model_quint8_avx2.onnx",
+    "min_cosine": 0.99
+}
+
 TEXT_SPLITTER_CONFIG = {
     "chunk_size": 500,
     "chunk_overlap": 50
 }
 
+DEDUP_CONFIG = {
+    "enabled": True,
+    "threshold": 0.8,
+    "num_perm": 64,
+    "bands": 16,
+    "shingle_size": 3,
+    "match_numbers": True
+}
+
+INDEX_CONFIG = {
+    "type": "flat",
+    "training_sample_size": 50000,
+    "ivf": {"nlist": 1024},
+    "hnsw": {"M": 32, "ef_construction": 200},
+    "ivfpq": {"nlist": 1024, "m": 48, "nbits": 8}
+}
+
+INDEX_SEARCH_PARAMS = {
+    "nprobe": 16,
+    "efSearch": 64
+}
+
+LEXICAL_INDEX_CONFIG = {
+    "k1": 1.2,
+    "b": 0.75,
+    "max_postings_per_term": 2000
+}
+
+HOT_RELOAD_CONFIG = {
+    "check_interval_s": 10,
+    "keep_previous_versions": 2
+}
+
+RETRIEVAL_SERVER_CONFIG = {
+    "enabled": False,
+    "socket_path": "cache/retrieval.sock",
+    "host": "127.0.0.1",
+    "port": 8765,
+    "timeout_s": 10.0,
+    "retry_after_s": 30.0,
+    "max_batch_size": 32,
+    "max_wait_ms": 5.0
+}
+
+INGEST_CONFIG = {
+    "batch_size": 64,
+    "workers": None
+}
+
+DOCUMENT_INDEX_CONFIG = {
+    "chunk_size": 400,
+    "chunk_overlap": 40,
+    "k": 4,
+    "max_cached_indexes": 16
+}
+
+CHAT_RENDER_CONFIG = {
+    "page_size": 10,
+    "length_buckets": [10, 50, 200, 1000]
+}
+
+BATCH_QA_CONFIG = {
+    "batch_size": 64,
+    "parallelism": 8,
+    "temperature": 0.0,
+    "default_language": "Simple English"
+}
+
+PROMPT_BUDGET_CONFIG = {
+    "total_tokens": 2000,
+    "recent_turns": 2,
+    "recent_turn_tokens": 300,
+    "summary_tokens": 50,
+    "max_history_turns": 12
+}
+
+ATTRIBUTION_CONFIG = {
+    "sentence_threshold": 0.6,
+    "min_supported_fraction": 0.3,
+    "languages": ["Simple English"],
+    "calibration_path": "attribution_calibration.json"
+}
+
+PDF_EXTRACTION_CONFIG = {
+    "min_text_chars": 25,
+    "render_scale": 2.5
+}
+
 SUPPORTED_FILE_TYPES = ["jpg", "jpeg", "png", "pdf"]
-MAX_IMAGE_SIZE_MB = 10
-IMAGE_COMPRESSION_QUALITY = 85
+
+IMAGE_PREPROCESS_CONFIG = {
+    "max_dimension": 2048,
+    "grayscale": False,
+    "target_bytes": 1024 * 1024,
+    "min_quality": 35,
+    "max_quality": 85
+}
+
+LLM_GATEWAY_CONFIG = {
+    "base_url": "https://generativelanguage.googleapis.com",
+    "requests_per_minute": 60,
+    "burst": 10,
+    "max_in_flight": 8,
+    "max_retries": 4,
+    "base_delay_s": 0.5,
+    "max_delay_s": 20.0,
+    "timeout_s": 120.0
+}
+
+TRACING_CONFIG = {
+    "enabled": True,
+    "metrics_path": "cache/metrics.prom",
+    "metrics_port": None,
+    "debug_panel": False,
+    "buckets_ms": [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+}
 
 LANGUAGES = [
     "Simple English",
@@ -0,0 +1,98 @@
+import hashlib
+import re
+import zlib
+import numpy as np
+from config import DEDUP_CONFIG
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MASK_32 = np.uint64(0xFFFFFFFF)
+
+
+def normalize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def number_tokens(tokens):
+    return " ".join(sorted({token for token in tokens if any(char.isdigit() for char in token)}))
+
+
+def shingle_hashes(tokens, shingle_size):
+    if len(tokens) <= shingle_size:
+        shingles = [" ".join(tokens)]
+    else:
+        shingles = [" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+    return np.fromiter({zlib.crc32(shingle.encode("utf-8")) for shingle in shingles}, dtype=np.uint64)
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=DEDUP_CONFIG["threshold"], num_perm=DEDUP_CONFIG["num_perm"],
+                 bands=DEDUP_CONFIG["bands"], shingle_size=DEDUP_CONFIG["shingle_size"],
+                 match_numbers=DEDUP_CONFIG["match_numbers"], seed=0):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.match_numbers = match_numbers
+        self._multipliers = rng.integers(1, 2 ** 32, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._offsets = rng.integers(0, 2 ** 32, num_perm, dtype=np.uint64)
+        self._exact = {}
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+        self._numbers = {}
+        self.stats = {"chunks": 0, "exact": 0, "near": 0}
+
+    def signature(self, tokens):
+        hashes = shingle_hashes(tokens, self.shingle_size)
+        permuted = ((hashes[:, None] ^ self._offsets) * self._multipliers) & MASK_32
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def prepare(self, text):
+        tokens = normalize(text)
+        return hashlib.sha1(" ".join(tokens).encode("utf-8")).digest(), self.signature(tokens), number_tokens(tokens)
+
+    def _lookup(self, digest, signature, numbers, band_keys):
+        if digest in self._exact:
+            self.stats["exact"] += 1
+            return self._exact[digest]
+        candidates = {candidate for band, band_key in enumerate(band_keys)
+                      for candidate in self._buckets[band].get(band_key, ())
+                      if not self.match_numbers or self._numbers[candidate] == numbers}
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        if best is not None:
+            self.stats["near"] += 1
+            self._exact[digest] = best
+        return best
+
+    def insert(self, key, prepared, band_keys=None):
+        digest, signature, numbers = prepared
+        self._exact.setdefault(digest, key)
+        self._signatures[key] = signature
+        self._numbers[key] = numbers
+        for band, band_key in enumerate(band_keys or self._band_keys(signature)):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def insert_exact(self, key, digest):
+        self._exact.setdefault(digest, key)
+
+    def add(self, key, prepared):
+        self.stats["chunks"] += 1
+        band_keys = self._band_keys(prepared[1])
+        representative = self._lookup(*prepared, band_keys)
+        if representative is None:
+            self.insert(key, prepared, band_keys)
+        return representative
+
+    @property
+    def duplicates(self):
+        return self.stats["exact"] + self.stats["near"]
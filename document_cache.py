@@ -0,0 +1,110 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (
+    file_hash TEXT PRIMARY KEY,
+    raw_text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS explanations (
+    file_hash TEXT NOT NULL,
+    language TEXT NOT NULL,
+    explanation TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (file_hash, language)
+);
+CREATE INDEX IF NOT EXISTS texts_last_access ON texts (last_access);
+CREATE INDEX IF NOT EXISTS explanations_last_access ON explanations (last_access);
+"""
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class DocumentCache:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_text(self, file_hash):
+        with self._connect() as conn:
+            row = conn.execute("SELECT raw_text FROM texts WHERE file_hash = ?", (file_hash,)).fetchone()
+            if row:
+                conn.execute("UPDATE texts SET last_access = ? WHERE file_hash = ?", (time.time(), file_hash))
+        return row[0] if row else None
+
+    def put_text(self, file_hash, raw_text):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO texts (file_hash, raw_text, size, last_access) VALUES (?, ?, ?, ?)",
+                (file_hash, raw_text, len(raw_text.encode("utf-8")), time.time())
+            )
+            self._evict(conn)
+
+    def get_explanation(self, file_hash, language):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT explanation FROM explanations WHERE file_hash = ? AND language = ?",
+                (file_hash, language)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE explanations SET last_access = ? WHERE file_hash = ? AND language = ?",
+                    (time.time(), file_hash, language)
+                )
+        return row[0] if row else None
+
+    def put_explanation(self, file_hash, language, explanation):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO explanations (file_hash, language, explanation, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_hash, language, explanation, len(explanation.encode("utf-8")), time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM texts) + "
+            "(SELECT COALESCE(SUM(size), 0) FROM explanations)"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute(
+            "SELECT 'texts', file_hash, NULL, size, last_access FROM texts "
+            "UNION ALL SELECT 'explanations', file_hash, language, size, last_access FROM explanations "
+            "ORDER BY last_access ASC"
+        ).fetchall()
+        for table, file_hash, language, size, _ in rows:
+            if total <= self.max_bytes:
+                break
+            if table == "texts":
+                conn.execute("DELETE FROM texts WHERE file_hash = ?", (file_hash,))
+            else:
+                conn.execute(
+                    "DELETE FROM explanations WHERE file_hash = ? AND language = ?",
+                    (file_hash, language)
+                )
+            total -= size
@@ -1,77 +1,288 @@
 import streamlit as st
-import google.generativeai as genai
 import json
-from PIL import Image
+import logging
+import re
+import time
+import numpy as np
+import pypdfium2 as pdfium
+from PIL import Image, ImageOps
+from pypdf import PdfReader
 import io
-from config import MODEL_NAME, MAX_IMAGE_SIZE_MB, IMAGE_COMPRESSION_QUALITY
+from document_cache import DocumentCache, hash_bytes
+from llm_gateway import GatewayError, get_gateway
+from tracing import record_genai_usage, span
+from config import (
+    IMAGE_PREPROCESS_CONFIG,
+    ATTRIBUTION_CONFIG,
+    DOCUMENT_CACHE_CONFIG,
+    EMBEDDING_MODEL,
+    PDF_EXTRACTION_CONFIG
+)
 
 
-def compress_image(image_bytes, max_size_mb=MAX_IMAGE_SIZE_MB, quality=IMAGE_COMPRESSION_QUALITY):
-    try:
-        image = Image.open(io.BytesIO(image_bytes))
+PAGE_SEPARATOR = "=== PAGE BREAK ==="
+
+
+logger = logging.getLogger(__name__)
+
+
+SENTENCE_PATTERN = re.compile(r"[^.!?।\n]+(?:[.!?।]+|$)", re.MULTILINE)
+
+
+def prepare_image(image, config=IMAGE_PREPROCESS_CONFIG):
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((config["max_dimension"], config["max_dimension"]), Image.LANCZOS)
+    return image.convert("L" if config["grayscale"] else "RGB")
 
+
+def encode_jpeg_within_budget(image, config=IMAGE_PREPROCESS_CONFIG):
+    def encode(quality):
         output = io.BytesIO()
         image.save(output, format="JPEG", quality=quality, optimize=True)
-        compressed_bytes = output.getvalue()
+        return output.getvalue()
 
-        size_mb = len(compressed_bytes) / (1024 * 1024)
-        if size_mb > max_size_mb:
-            quality = int(quality * 0.8)
-            return compress_image(image_bytes, max_size_mb, quality)
+    low, high = config["min_quality"], config["max_quality"]
+    best = encode(high)
+    if len(best) <= config["target_bytes"]:
+        return best, high
 
-        return compressed_bytes
-    except Exception as e:
-        st.error(f"Error compressing image: {e}")
-        return image_bytes
+    best_quality = low
+    best = encode(low)
+    while high - low > 1:
+        quality = (low + high) // 2
+        encoded = encode(quality)
+        if len(encoded) <= config["target_bytes"]:
+            low, best, best_quality = quality, encoded, quality
+        else:
+            high = quality
+    return best, best_quality
 
 
-def extract_and_explain_document(file_bytes, file_type, language):
+@st.cache_data(max_entries=64, show_spinner=False)
+def preprocess_image(upload_hash, _image_bytes):
+    start = time.perf_counter()
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
+        image = prepare_image(Image.open(io.BytesIO(_image_bytes)))
+        output_bytes, quality = encode_jpeg_within_budget(image)
+    except Exception as e:
+        st.error(f"Error processing image: {e}")
+        return _image_bytes, None
+
+    stats = {
+        "input_bytes": len(_image_bytes),
+        "output_bytes": len(output_bytes),
+        "ms": (time.perf_counter() - start) * 1000,
+        "size": image.size,
+        "quality": quality
+    }
+    logger.info("Image %s: %d -> %d bytes (%dx%d, q=%d) in %.0f ms", upload_hash[:12],
+                stats["input_bytes"], stats["output_bytes"], *image.size, quality, stats["ms"])
+    return output_bytes, stats
+
 
-        prompt_text = f"""
+@st.cache_resource
+def get_document_cache():
+    return DocumentCache(**DOCUMENT_CACHE_CONFIG)
+
+
+def extract_document_text(file_bytes, file_type):
+    prompt_text = f"""
 You are an AI assistant. The user has uploaded a document (MIME type: {file_type}).
-Perform two tasks:
-1. Extract all raw text from the document.
-2. Explain the document in simple, everyday {language}.
-
-Respond with ONLY a JSON object in this format:
-{{
-  "raw_text": "The raw extracted text...",
-  "explanation": "Your simple {language} explanation..."
-}}
+Extract all raw text from the document exactly as it is written.
+Respond with ONLY the extracted text, without any commentary.
 """
+    data_part = {"mime_type": file_type, "data": file_bytes}
+    with span("gemini_extract", input_bytes=len(file_bytes)) as opened:
+        response = get_gateway().generate_content([prompt_text, data_part])
+        record_genai_usage(opened, response)
+    return response.text.strip()
+
+
+def iter_pdf_page_texts(file_bytes):
+    reader = PdfReader(io.BytesIO(file_bytes))
+    for page in reader.pages:
+        yield (page.extract_text() or "").strip()
+
+
+def render_pdf_pages(file_bytes, page_indexes):
+    pdf = pdfium.PdfDocument(file_bytes)
+    try:
+        for i in page_indexes:
+            image = prepare_image(pdf[i].render(scale=PDF_EXTRACTION_CONFIG["render_scale"]).to_pil())
+            yield encode_jpeg_within_budget(image)[0]
+    finally:
+        pdf.close()
+
+
+def extract_scanned_pages_text(page_images):
+    prompt_text = f"""
+You are an AI assistant. The user has uploaded {len(page_images)} scanned page image(s) of one document.
+Extract all raw text from each page exactly as it is written, in page order.
+Put a line containing only {PAGE_SEPARATOR} between pages.
+Respond with ONLY the extracted text, without any commentary.
+"""
+    parts = [prompt_text] + [{"mime_type": "image/jpeg", "data": image} for image in page_images]
+    with span("gemini_extract", input_bytes=sum(len(image) for image in page_images),
+              pages=len(page_images)) as opened:
+        response = get_gateway().generate_content(parts)
+        record_genai_usage(opened, response)
+    texts = [text.strip() for text in response.text.split(PAGE_SEPARATOR)]
+    if len(texts) != len(page_images):
+        return [response.text.replace(PAGE_SEPARATOR, "").strip()] + [""] * (len(page_images) - 1)
+    return texts
+
+
+def extract_pdf_text(file_bytes):
+    start = time.perf_counter()
+    pages = []
+    scanned = []
+    with span("pdf_text_layer", input_bytes=len(file_bytes)) as opened:
+        for i, text in enumerate(iter_pdf_page_texts(file_bytes)):
+            if len(text) >= PDF_EXTRACTION_CONFIG["min_text_chars"]:
+                pages.append(text)
+            else:
+                pages.append("")
+                scanned.append(i)
+        opened.set(pages=len(pages), scanned=len(scanned))
+
+    uploaded_bytes = 0
+    if scanned:
+        with span("pdf_render", pages=len(scanned)):
+            page_images = list(render_pdf_pages(file_bytes, scanned))
+        uploaded_bytes = sum(len(image) for image in page_images)
+        for i, text in zip(scanned, extract_scanned_pages_text(page_images)):
+            pages[i] = text
 
-        data_part = {"mime_type": file_type, "data": file_bytes}
-        response = model.generate_content([prompt_text, data_part])
-        clean_response_text = response.text.strip().replace("```json", "").replace("```", "")
+    logger.info("PDF text: %d pages, %d scanned, uploaded %d of %d bytes in %.0f ms",
+                len(pages), len(scanned), uploaded_bytes, len(file_bytes),
+                (time.perf_counter() - start) * 1000)
+    return "\n\n".join(page for page in pages if page)
 
-        try:
-            response_json = json.loads(clean_response_text)
-            return response_json.get("explanation"), response_json.get("raw_text")
-        except json.JSONDecodeError:
-            st.error("AI response was not in valid JSON format. Please try again.")
-            return None, None
 
+def explain_document_text(raw_text, language):
+    prompt_text = f"""
+You are 'Nyay-Saathi,' a kind legal friend.
+Explain the following legal document in simple, everyday {language}.
+Do not use any legal jargon.
+
+DOCUMENT:
+{raw_text}
+"""
+    with span("gemini_explain", input_bytes=len(prompt_text.encode("utf-8"))) as opened:
+        response = get_gateway().generate_content(prompt_text)
+        record_genai_usage(opened, response)
+    return response.text.strip()
+
+
+def extract_and_explain_document(file_bytes, file_type, language):
+    try:
+        cache = get_document_cache()
+        file_hash = hash_bytes(file_bytes)
+
+        start = time.perf_counter()
+        raw_text = cache.get_text(file_hash)
+        if raw_text is None:
+            if "pdf" in file_type:
+                raw_text = extract_pdf_text(file_bytes)
+            else:
+                raw_text = extract_document_text(file_bytes, file_type)
+            if not raw_text:
+                st.error("Could not read any text from this document. Please try again.")
+                return None, None
+            cache.put_text(file_hash, raw_text)
+            logger.info("Extracted %s in %.0f ms", file_hash[:12], (time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        explanation = cache.get_explanation(file_hash, language)
+        if explanation is None:
+            explanation = explain_document_text(raw_text, language)
+            cache.put_explanation(file_hash, language, explanation)
+            logger.info("Explained %s in %s in %.0f ms", file_hash[:12], language,
+                        (time.perf_counter() - start) * 1000)
+
+        return explanation, raw_text
+
+    except GatewayError as e:
+        logger.warning("Document processing failed after retries: %s", e)
+        st.error("Your friend is getting a lot of requests right now. Please try again in a minute.")
+        return None, None
     except Exception as e:
         st.error(f"Error processing document: {e}")
         return None, None
 
 
-def audit_response_source(prompt, response, document_context, model_name=MODEL_NAME):
+def split_sentences(text, min_chars=12):
+    spans = []
+    for match in SENTENCE_PATTERN.finditer(text):
+        sentence = match.group().strip()
+        if len(sentence) >= min_chars:
+            start = match.start() + match.group().index(sentence)
+            spans.append((sentence, start, start + len(sentence)))
+    return spans
+
+
+def _unit_rows(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def embed_document_spans(document_context, _embeddings):
+    spans = split_sentences(document_context)
+    if not spans:
+        return spans, np.zeros((0, 0), dtype=np.float32)
+    return spans, _unit_rows(_embeddings.embed_documents([span[0] for span in spans]))
+
+
+@st.cache_data(show_spinner=False)
+def load_attribution_thresholds(model_name, path=ATTRIBUTION_CONFIG["calibration_path"]):
+    defaults = ATTRIBUTION_CONFIG["sentence_threshold"], ATTRIBUTION_CONFIG["min_supported_fraction"]
     try:
-        audit_model = genai.GenerativeModel(model_name)
-        audit_prompt = f"""
-You are an auditor.
-Question: "{prompt}"
-Answer: "{response}"
-Context: "{document_context}"
-
-Did the "Answer" come *primarily* from the "Context"?
-Respond with ONLY the word 'YES' or 'NO'.
-"""
-        audit_response = audit_model.generate_content(audit_prompt)
-        return "YES" in audit_response.text.upper()
-    except Exception as e:
-        st.warning(f"Could not audit response source: {e}")
-        return False
+        with open(path, "r", encoding="utf-8") as f:
+            calibration = json.load(f)
+    except FileNotFoundError:
+        logger.warning("No attribution calibration at %s; using the uncalibrated defaults %s", path, defaults)
+        return defaults
+    if calibration.get("embedding_model") != model_name:
+        logger.warning("Attribution calibration in %s is for %s, not %s; using the uncalibrated defaults %s",
+                       path, calibration.get("embedding_model"), model_name, defaults)
+        return defaults
+    return calibration["sentence_threshold"], calibration["min_supported_fraction"]
+
+
+def score_answer_sentences(response, document_context, embeddings):
+    answer_sentences = [sentence for sentence, _, _ in split_sentences(response)]
+    doc_spans, doc_matrix = embed_document_spans(document_context, embeddings)
+    if not answer_sentences or not doc_spans:
+        return []
+
+    similarities = _unit_rows(embeddings.embed_documents(answer_sentences)) @ doc_matrix.T
+    best = similarities.argmax(axis=1)
+    sentences = []
+    for i, sentence in enumerate(answer_sentences):
+        span_text, start, end = doc_spans[best[i]]
+        sentences.append({
+            "sentence": sentence,
+            "score": float(similarities[i, best[i]]),
+            "support": {"text": span_text, "start": start, "end": end}
+        })
+    return sentences
+
+
+def attribute_response_source(response, document_context, embeddings, language, thresholds=None):
+    if language not in ATTRIBUTION_CONFIG["languages"]:
+        return {"used_document": True, "score": None, "sentences": [], "skipped": "language"}
+    sentence_threshold, min_supported_fraction = thresholds or load_attribution_thresholds(
+        getattr(embeddings, "model_name", EMBEDDING_MODEL)
+    )
+    sentences = score_answer_sentences(response, document_context, embeddings)
+    if not sentences:
+        return {"used_document": False, "score": 0.0, "sentences": []}
+
+    supported = sum(item["score"] >= sentence_threshold for item in sentences)
+    return {
+        "used_document": supported / len(sentences) >= min_supported_fraction,
+        "score": float(np.mean([item["score"] for item in sentences])),
+        "sentences": sentences
+    }
@@ -0,0 +1,58 @@
+import logging
+import time
+from config import EMBEDDING_BACKEND_CONFIG, EMBEDDING_DEVICE, EMBEDDING_MODEL
+
+
+logger = logging.getLogger(__name__)
+
+TORCH_BACKENDS = ("cpu", "cuda", "mps", "int8")
+ONNX_BACKENDS = ("onnx", "onnx-int8")
+EMBEDDING_BACKENDS = TORCH_BACKENDS + ONNX_BACKENDS
+
+
+def _onnx_model_kwargs(backend, threads):
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError(
+            f"Embedding backend '{backend}' needs ONNX Runtime. Install it with "
+            "`pip install \"sentence-transformers[onnx]\"`."
+        ) from e
+
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    model_kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+    if backend == "onnx-int8":
+        model_kwargs["file_name"] = EMBEDDING_BACKEND_CONFIG["onnx_int8_file"]
+    return {"device": "cpu", "backend": "onnx", "model_kwargs": model_kwargs}
+
+
+def create_embeddings(backend=EMBEDDING_DEVICE, threads=EMBEDDING_BACKEND_CONFIG["threads"],
+                      batch_size=EMBEDDING_BACKEND_CONFIG["batch_size"], model_name=EMBEDDING_MODEL):
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose one of: {', '.join(EMBEDDING_BACKENDS)}")
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    start = time.perf_counter()
+    if backend in ONNX_BACKENDS:
+        model_kwargs = _onnx_model_kwargs(backend, threads)
+    else:
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        model_kwargs = {"device": "cpu" if backend == "int8" else backend}
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": batch_size}
+    )
+    if backend == "int8":
+        import torch
+        torch.quantization.quantize_dynamic(embeddings.client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    logger.info("Loaded %s embeddings with the %s backend in %.0f ms (threads: %s, batch size: %d)",
+                model_name, backend, (time.perf_counter() - start) * 1000, threads or "default", batch_size)
+    return embeddings
@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from embedding_backends import EMBEDDING_BACKENDS
+from config import DATA_PATH, EMBEDDING_BACKEND_CONFIG, RAG_CONFIG, TEXT_SPLITTER_CONFIG
+
+
+def load_texts(data_path, num_texts, num_queries, seed):
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=TEXT_SPLITTER_CONFIG["chunk_size"],
+        chunk_overlap=TEXT_SPLITTER_CONFIG["chunk_overlap"]
+    )
+    chunks = []
+    for name in sorted(os.listdir(data_path)):
+        if name.endswith(".txt"):
+            with open(os.path.join(data_path, name), "r", encoding="utf-8") as f:
+                chunks.extend(splitter.split_text(f.read()))
+    if not chunks:
+        raise SystemExit(f"Error: No .txt files with text found in '{data_path}'")
+    order = np.random.default_rng(seed).permutation(len(chunks))
+    return [chunks[i] for i in order[:num_texts]], [chunks[i][:200] for i in order[:num_queries]]
+
+
+def rss_mb():
+    with open("/proc/self/status", "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith(("VmRSS", "VmHWM")):
+                yield line.split(":")[0], int(line.split()[1]) / 1024
+
+
+def run_backend(backend, texts_path, vectors_path, threads, batch_size):
+    start = time.perf_counter()
+    from embedding_backends import create_embeddings
+    embeddings = create_embeddings(backend, threads=threads, batch_size=batch_size)
+    load_seconds = time.perf_counter() - start
+    rss_after_load = dict(rss_mb())["VmRSS"]
+
+    with open(texts_path, "r", encoding="utf-8") as f:
+        texts, queries = json.load(f)
+    embeddings.embed_documents(texts[:batch_size])
+
+    start = time.perf_counter()
+    corpus = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    documents_seconds = time.perf_counter() - start
+
+    latencies, query_vectors = [], []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(embeddings.embed_query(query))
+        latencies.append(time.perf_counter() - start)
+
+    np.savez(vectors_path, corpus=corpus, queries=np.asarray(query_vectors, dtype=np.float32))
+    return {
+        "load_seconds": load_seconds,
+        "rss_after_load_mb": rss_after_load,
+        "peak_rss_mb": dict(rss_mb())["VmHWM"],
+        "documents_per_sec": len(texts) / documents_seconds,
+        "query_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "query_p99_ms": float(np.percentile(latencies, 99) * 1000)
+    }
+
+
+def normalize(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def parity(reference, candidate, k):
+    cosines = np.sum(normalize(reference["corpus"]) * normalize(candidate["corpus"]), axis=1)
+    expected = np.argsort(-normalize(reference["queries"]) @ normalize(reference["corpus"]).T, axis=1)[:, :k]
+    found = np.argsort(-normalize(candidate["queries"]) @ normalize(candidate["corpus"]).T, axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(expected, found)])
+    return {"mean_cosine": float(cosines.mean()), "min_cosine": float(cosines.min()), "top_k_overlap": float(overlap)}
+
+
+def run_report(backends, reference, data_path, num_texts, num_queries, k, threads, batch_size, seed):
+    texts, queries = load_texts(data_path, num_texts, num_queries, seed)
+    print(f"Corpus: {len(texts)} chunks, {len(queries)} queries, k={k}, threads={threads or 'default'}, "
+          f"batch size={batch_size}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        texts_path = os.path.join(work_dir, "texts.json")
+        with open(texts_path, "w", encoding="utf-8") as f:
+            json.dump([texts, queries], f)
+
+        vectors = {}
+        for backend in [reference] + [b for b in backends if b != reference]:
+            print(f"Running {backend}...")
+            vectors_path = os.path.join(work_dir, f"{backend}.npz")
+            result_path = os.path.join(work_dir, f"{backend}.json")
+            command = [sys.executable, os.path.abspath(__file__), "--worker", backend, "--texts", texts_path,
+                       "--vectors", vectors_path, "--result", result_path, "--batch-size", str(batch_size)]
+            if threads:
+                command += ["--threads", str(threads)]
+            completed = subprocess.run(command)
+            if completed.returncode != 0:
+                results.append({"backend": backend, "error": f"worker exited with {completed.returncode}"})
+                continue
+            with open(result_path, "r", encoding="utf-8") as f:
+                row = {"backend": backend, **json.load(f)}
+            vectors[backend] = dict(np.load(vectors_path))
+            if reference in vectors:
+                row.update(parity(vectors[reference], vectors[backend], k))
+            results.append(row)
+    return results
+
+
+def print_report(results, reference, min_cosine):
+    print(f"\n{'backend':<10} {'load s':>7} {'RSS MB':>7} {'peak MB':>8} {'docs/s':>8} "
+          f"{'q p50 ms':>9} {'q p99 ms':>9} {'cos mean':>9} {'cos min':>8} {'top-k':>6}")
+    failed = []
+    for row in results:
+        if "error" in row:
+            print(f"{row['backend']:<10} {row['error']}")
+            failed.append(f"{row['backend']} (did not run)")
+            continue
+        print(f"{row['backend']:<10} {row['load_seconds']:>7.2f} {row['rss_after_load_mb']:>7.0f} "
+              f"{row['peak_rss_mb']:>8.0f} {row['documents_per_sec']:>8.1f} {row['query_p50_ms']:>9.2f} "
+              f"{row['query_p99_ms']:>9.2f} {row.get('mean_cosine', float('nan')):>9.4f} "
+              f"{row.get('min_cosine', float('nan')):>8.4f} {row.get('top_k_overlap', float('nan')):>6.3f}")
+        if row["backend"] != reference and row.get("min_cosine", 0.0) < min_cosine:
+            failed.append(row["backend"])
+    if failed:
+        print(f"\n✗ Parity check failed (min cosine < {min_cosine} against {reference}): {', '.join(failed)}")
+    else:
+        print(f"\n✓ All backends match {reference} (min cosine >= {min_cosine})")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare embedding backends for throughput, memory and parity with the reference backend."
+    )
+    parser.add_argument("--backends", nargs="+", choices=EMBEDDING_BACKENDS,
+                        default=["cpu", "int8", "onnx", "onnx-int8"])
+    parser.add_argument("--reference", choices=EMBEDDING_BACKENDS, default="cpu")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--num-texts", type=int, default=1000)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=RAG_CONFIG["search_kwargs"]["k"])
+    parser.add_argument("--threads", type=int, default=EMBEDDING_BACKEND_CONFIG["threads"])
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BACKEND_CONFIG["batch_size"])
+    parser.add_argument("--min-cosine", type=float, default=EMBEDDING_BACKEND_CONFIG["min_cosine"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results as JSON to this path.")
+    parser.add_argument("--worker", choices=EMBEDDING_BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--texts", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_backend(args.worker, args.texts, args.vectors, args.threads, args.batch_size)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        sys.exit(0)
+
+    report = run_report(args.backends, args.reference, args.data, args.num_texts, args.num_queries, args.k,
+                        args.threads, args.batch_size, args.seed)
+    failed = print_report(report, args.reference, args.min_cosine)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report written to {args.output}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+ENDPOINT_PATTERN = re.compile(r"^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)")
+
+ANSWER_STEPS = (
+    "Stay calm and write down what happened, with dates and names.",
+    "Keep copies of every document, notice and receipt.",
+    "Contact your nearest District Legal Services Authority for free legal aid.",
+    "Do not sign anything you do not understand."
+)
+
+
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.model_name = f"hashing-{dim}"
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            bucket = zlib.crc32(token.encode("utf-8"))
+            vector[bucket % self.dim] += 1.0 if bucket & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def fake_answer(prompt):
+    question = (prompt.rsplit("NEW QUESTION:", 1)[-1].strip().splitlines() or [""])[0]
+    digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+    steps = [ANSWER_STEPS[(digest + i) % len(ANSWER_STEPS)] for i in range(3)]
+    return f"About \"{question[:80]}\":\n" + "\n".join(f"{i + 1}. {step}" for i, step in enumerate(steps))
+
+
+def fake_generate(body):
+    parts = [part for content in body.get("contents", []) for part in content.get("parts", [])]
+    prompt = "\n".join(part["text"] for part in parts if "text" in part)
+    uploads = [part["inline_data"] for part in parts if "inline_data" in part]
+    if not uploads:
+        return fake_answer(prompt), estimate_tokens(prompt)
+
+    pages = [f"Page {i + 1}: extracted text of a {upload['mime_type']} upload "
+             f"({len(upload['data']) * 3 // 4} bytes)." for i, upload in enumerate(uploads)]
+    separator = re.search(r"containing only (.+)\n", prompt)
+    text = f"\n{separator.group(1)}\n".join(pages) if separator else "\n".join(pages)
+    return text, estimate_tokens(prompt) + 258 * len(uploads)
+
+
+class FakeGeminiServer:
+    def __init__(self, latency_s=0.0, token_delay_s=0.0, error_rate=0.0, error_status=429, seed=0,
+                 host="127.0.0.1", port=0):
+        self.latency_s = latency_s
+        self.token_delay_s = token_delay_s
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._failures = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fail_next(self, count, status=429):
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def _next_error(self):
+        with self._lock:
+            self.calls += 1
+            if self._failures:
+                status = self._failures.popleft()
+            elif self._rng.random() < self.error_rate:
+                status = self.error_status
+            else:
+                return None
+            self.errors += 1
+            return status
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                match = ENDPOINT_PATTERN.match(self.path)
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if match is None:
+                    self._send_json(404, {"error": {"code": 404, "message": "Unknown endpoint"}})
+                    return
+
+                time.sleep(fake.latency_s)
+                status = fake._next_error()
+                if status is not None:
+                    self._send_json(status, {"error": {"code": status, "message": "Injected fake error"}})
+                    return
+
+                text, prompt_tokens = fake_generate(body)
+                usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": estimate_tokens(text),
+                         "totalTokenCount": prompt_tokens + estimate_tokens(text)}
+                if match.group(2) == "generateContent":
+                    self._send_json(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                                                          "finishReason": "STOP"}],
+                                          "usageMetadata": usage})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                words = text.split(" ")
+                sent = ""
+                for i, word in enumerate(words):
+                    piece = word if i == len(words) - 1 else word + " "
+                    sent += piece
+                    chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}],
+                             "usageMetadata": {"promptTokenCount": prompt_tokens,
+                                               "candidatesTokenCount": estimate_tokens(sent),
+                                               "totalTokenCount": prompt_tokens + estimate_tokens(sent)}}
+                    try:
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    time.sleep(fake.token_delay_s)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
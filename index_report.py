@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+import faiss
+import numpy as np
+from config import (
+    DB_FAISS_PATH,
+    DOCSTORE_FILE,
+    INDEX_CONFIG,
+    INDEX_FILE,
+    INGEST_CONFIG,
+    RAG_CONFIG
+)
+from vector_store import (
+    INDEX_TYPES,
+    apply_search_params,
+    build_index,
+    current_version,
+    index_spec,
+    resolve_index_spec
+)
+
+
+SEARCH_SWEEPS = {
+    "flat": ("", [None]),
+    "ivf": ("nprobe", [1, 4, 16, 64]),
+    "hnsw": ("efSearch", [16, 32, 64, 128]),
+    "ivfpq": ("nprobe", [1, 4, 16, 64])
+}
+
+
+def get_embeddings():
+    from embedding_backends import create_embeddings
+    return create_embeddings()
+
+
+def load_corpus_vectors(db_path, batch_size):
+    index = faiss.read_index(os.path.join(db_path, INDEX_FILE))
+    if isinstance(index, faiss.IndexIDMap2):
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexFlat):
+            return inner.reconstruct_n(0, inner.ntotal)
+
+    print("Stored index is not exact, re-embedding chunks from the docstore...")
+    embeddings = get_embeddings()
+    vectors = []
+    conn = sqlite3.connect(os.path.join(db_path, DOCSTORE_FILE))
+    cursor = conn.execute("SELECT page_content FROM chunks ORDER BY id")
+    while rows := cursor.fetchmany(batch_size):
+        vectors.extend(embeddings.embed_documents([row[0] for row in rows]))
+    conn.close()
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def load_query_vectors(queries_path, corpus, num_queries, seed):
+    if queries_path:
+        with open(queries_path, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        return corpus, np.asarray(get_embeddings().embed_documents(queries), dtype=np.float32)
+
+    held_out = np.random.default_rng(seed).permutation(len(corpus))
+    num_queries = min(num_queries, len(corpus) // 10 or 1)
+    return corpus[held_out[num_queries:]], corpus[held_out[:num_queries]]
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def evaluate(index, queries, ground_truth, k):
+    latencies, hits = [], 0
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, found = index.search(queries[i:i + 1], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[0]) & set(ground_truth[i]))
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99)
+    }
+
+
+def run_report(db_path, index_types, k, queries_path, num_queries, seed):
+    _, store_path = current_version(db_path)
+    corpus = load_corpus_vectors(store_path, INGEST_CONFIG["batch_size"])
+    base, queries = load_query_vectors(queries_path, corpus, num_queries, seed)
+    ids = np.arange(len(base), dtype=np.int64)
+    print(f"Corpus: {len(base)} vectors, {len(queries)} held-out queries, k={k}")
+
+    exact = faiss.IndexFlatL2(base.shape[1])
+    exact.add(base)
+    _, ground_truth = exact.search(queries, k)
+
+    training = base[np.random.default_rng(seed).permutation(len(base))[:INDEX_CONFIG["training_sample_size"]]]
+    results = []
+    for index_type in index_types:
+        spec = resolve_index_spec(index_spec(INDEX_CONFIG, index_type), len(training))
+        start = time.perf_counter()
+        index = build_index(base.shape[1], spec)
+        if not index.is_trained:
+            index.train(training)
+        index.add_with_ids(base, ids)
+        build_seconds = time.perf_counter() - start
+        index_bytes = faiss.serialize_index(index).nbytes
+
+        param_name, values = SEARCH_SWEEPS[spec["type"]]
+        for value in values:
+            if param_name:
+                apply_search_params(index, {param_name: value})
+            results.append({
+                "index": spec,
+                "search_param": {param_name: value} if param_name else {},
+                "index_bytes": int(index_bytes),
+                "build_seconds": build_seconds,
+                **evaluate(index, queries, ground_truth, k)
+            })
+    return results
+
+
+def print_report(results):
+    print(f"\n{'index':<44} {'search':<14} {'recall@k':>8} {'p50 ms':>8} {'p99 ms':>8} {'MB':>8} {'build s':>8}")
+    for row in results:
+        search = ", ".join(f"{name}={value}" for name, value in row["search_param"].items()) or "-"
+        index = " ".join([row["index"]["type"]] + [f"{name}={value}" for name, value in row["index"].items()
+                                                   if name != "type"])
+        print(f"{index:<44} {search:<14} {row['recall_at_k']:>8.3f} "
+              f"{row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {row['index_bytes'] / 2 ** 20:>8.1f} "
+              f"{row['build_seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare FAISS index types against exact search on a held-out query set."
+    )
+    parser.add_argument("--db", default=DB_FAISS_PATH, help="Vector store produced by ingest.py.")
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--k", type=int, default=RAG_CONFIG["search_kwargs"]["k"])
+    parser.add_argument("--queries", help="Text file with one held-out query per line. "
+                                          "Defaults to holding out a sample of stored chunks.")
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results as JSON to this path.")
+    args = parser.parse_args()
+
+    report = run_report(args.db, args.types, args.k, args.queries, args.num_queries, args.seed)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report written to {args.output}")
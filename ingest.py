@@ -1,60 +1,265 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+import resource
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from dedup import NearDuplicateIndex
+from embedding_backends import EMBEDDING_BACKENDS, create_embeddings
+from vector_store import (
+    INDEX_TYPES,
+    VectorStoreWriter,
+    current_version,
+    index_spec,
+    is_legacy_store,
+    supports_removal
+)
 from config import (
     DATA_PATH,
     DB_FAISS_PATH,
+    DEDUP_CONFIG,
     EMBEDDING_MODEL,
     EMBEDDING_DEVICE,
-    TEXT_SPLITTER_CONFIG
+    TEXT_SPLITTER_CONFIG,
+    INDEX_CONFIG,
+    INGEST_CONFIG,
+    MANIFEST_FILE
 )
 
 
-def create_vector_db():
-    data_path = "data/"
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def peak_rss_mb():
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own * scale / (1024 * 1024), children * scale / (1024 * 1024)
+
+
+def load_manifest(db_path, spec, model_name=EMBEDDING_MODEL):
+    _, store_path = current_version(db_path)
+    manifest_path = os.path.join(store_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path) or is_legacy_store(store_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if (manifest.get("embedding_model") != model_name or
+            manifest.get("text_splitter") != TEXT_SPLITTER_CONFIG or
+            manifest.get("dedup") != DEDUP_CONFIG or
+            manifest.get("index") != spec):
+        return None
+    return manifest
+
+
+def split_file(path, file_hash):
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=TEXT_SPLITTER_CONFIG["chunk_size"],
+        chunk_overlap=TEXT_SPLITTER_CONFIG["chunk_overlap"]
+    )
+    with open(path, "r", encoding="utf-8") as f:
+        texts = text_splitter.split_text(f.read())
+    name = os.path.basename(path)
+    ids = [f"{name}:{file_hash[:16]}:{i}" for i in range(len(texts))]
+    metadatas = [{"source": path} for _ in texts]
+    if DEDUP_CONFIG["enabled"]:
+        dedup = NearDuplicateIndex()
+        signatures = [dedup.prepare(text) for text in texts]
+    else:
+        signatures = [None] * len(texts)
+    return name, ids, texts, metadatas, signatures
+
+
+def iter_split_files(jobs, workers):
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = deque(pool.submit(split_file, *job) for _, job in zip(range(workers * 2), jobs))
+        while pending:
+            result = pending.popleft().result()
+            job = next(jobs, None)
+            if job is not None:
+                pending.append(pool.submit(split_file, *job))
+            yield result
+
+
+def iter_batches(split_results, batch_size, files, dedup=None):
+    ids, texts, metadatas, signatures = [], [], [], []
+    for name, file_ids, file_texts, file_metadatas, file_signatures in split_results:
+        refs = []
+        for key, text, metadata, signature in zip(file_ids, file_texts, file_metadatas, file_signatures):
+            representative = dedup.add(key, signature) if dedup else None
+            refs.append(representative or key)
+            if representative is None:
+                ids.append(key)
+                texts.append(text)
+                metadatas.append(metadata)
+                signatures.append(signature)
+        files[name]["chunk_ids"] = refs
+        while len(texts) >= batch_size:
+            yield ids[:batch_size], texts[:batch_size], metadatas[:batch_size], signatures[:batch_size]
+            del ids[:batch_size], texts[:batch_size], metadatas[:batch_size], signatures[:batch_size]
+    if texts:
+        yield ids, texts, metadatas, signatures
+
+
+def source_metadata(files, keys, data_path):
+    sources = {key: [] for key in keys}
+    for name in sorted(files):
+        path = os.path.join(data_path, name)
+        for key in files[name]["chunk_ids"]:
+            if key in sources and path not in sources[key]:
+                sources[key].append(path)
+    return {key: {"source": paths[0], "sources": paths} for key, paths in sources.items() if paths}
+
+
+def create_vector_db(
+    data_path=DATA_PATH,
+    db_path=DB_FAISS_PATH,
+    full_rebuild=False,
+    index_type=None,
+    batch_size=INGEST_CONFIG["batch_size"],
+    workers=INGEST_CONFIG["workers"],
+    embeddings=None,
+    embedding_backend=EMBEDDING_DEVICE
+):
     if not os.path.exists(data_path):
         print(f"Error: Data path '{data_path}' does not exist.")
         print("Please ensure you have a 'data/' folder with .txt files.")
         sys.exit(1)
 
-    txt_files = [f for f in os.listdir(data_path) if f.endswith('.txt')]
+    txt_files = sorted(f for f in os.listdir(data_path) if f.endswith('.txt'))
     if not txt_files:
         print(f"Error: No .txt files found in '{data_path}'")
         sys.exit(1)
 
     print(f"Found {len(txt_files)} text files: {txt_files}")
+    workers = workers or os.cpu_count() or 1
+    spec = index_spec(INDEX_CONFIG, index_type)
 
     try:
-        print("\n[1/4] Loading documents...")
-        loader = DirectoryLoader(data_path, glob='*.txt', loader_cls=TextLoader)
-        documents = loader.load()
-        print(f"✓ Loaded {len(documents)} documents")
-
-        print("\n[2/4] Splitting documents into chunks...")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=TEXT_SPLITTER_CONFIG["chunk_size"],
-            chunk_overlap=TEXT_SPLITTER_CONFIG["chunk_overlap"]
-        )
-        chunks = text_splitter.split_documents(documents)
-        print(f"✓ Created {len(chunks)} chunks")
+        print("\n[1/4] Comparing documents against manifest...")
+        file_hashes = {name: file_sha256(os.path.join(data_path, name)) for name in txt_files}
+
+        model_name = getattr(embeddings, "model_name", EMBEDDING_MODEL)
+        manifest = None if full_rebuild else load_manifest(db_path, spec, model_name)
+        if manifest is None:
+            print("✓ No usable manifest found, rebuilding from scratch")
+        elif not supports_removal(manifest["effective_index"]) and any(
+                file_hashes.get(name) != entry["sha256"] for name, entry in manifest["files"].items()):
+            print(f"✓ {manifest['effective_index']['type']} index cannot delete vectors, rebuilding from scratch")
+            manifest = None
+        previous_files = manifest["files"] if manifest else {}
+
+        changed = [name for name in txt_files
+                   if previous_files.get(name, {}).get("sha256") != file_hashes[name]]
+        unchanged = [name for name in txt_files if name not in changed]
+        stale_candidates = {
+            chunk_id
+            for name, entry in previous_files.items()
+            if name not in unchanged
+            for chunk_id in entry["chunk_ids"]
+        }
+        live = {chunk_id for name in unchanged for chunk_id in previous_files[name]["chunk_ids"]}
+        reused = len(live)
+        print(f"✓ {len(unchanged)} unchanged, {len(changed)} new or changed, "
+              f"{len([n for n in previous_files if n not in file_hashes])} removed")
 
-        print("\n[3/4] Loading embedding model...")
-        embeddings = HuggingFaceEmbeddings(
-            model_name=EMBEDDING_MODEL,
-            model_kwargs={"device": EMBEDDING_DEVICE}
+        if not changed and not stale_candidates:
+            print("\nVector store is already up to date. Nothing to do.")
+            return
+
+        print("\n[2/4] Loading embedding model...")
+        if embeddings is None:
+            embeddings = create_embeddings(embedding_backend)
+        model_name = getattr(embeddings, "model_name", EMBEDDING_MODEL)
+        print(f"✓ Embedding model loaded: {model_name} ({embedding_backend} backend)")
+
+        writer = VectorStoreWriter(
+            db_path,
+            manifest["effective_index"] if manifest else spec,
+            incremental=manifest is not None,
+            training_sample_size=INDEX_CONFIG["training_sample_size"]
         )
-        print(f"✓ Embedding model loaded: {EMBEDDING_MODEL}")
+        try:
+            dedup = None
+            if DEDUP_CONFIG["enabled"]:
+                dedup = NearDuplicateIndex()
+                retired = []
+                for key, signature in writer.iter_signatures():
+                    if key in live:
+                        dedup.insert(key, signature)
+                    else:
+                        retired.append((key, signature[0]))
+                for key, digest in retired:
+                    dedup.insert_exact(key, digest)
+
+            print(f"\n[3/4] Splitting ({workers} workers) and embedding (batches of {batch_size})...")
+            files = {name: previous_files[name] for name in unchanged}
+            files.update({name: {"sha256": file_hashes[name], "chunk_ids": []} for name in changed})
+            jobs = ((os.path.join(data_path, name), file_hashes[name]) for name in changed)
+
+            added = 0
+            embed_seconds = 0.0
+            start = time.perf_counter()
+            for ids, texts, metadatas, signatures in iter_batches(iter_split_files(jobs, workers), batch_size,
+                                                                  files, dedup):
+                embed_start = time.perf_counter()
+                vectors = embeddings.embed_documents(texts)
+                embed_seconds += time.perf_counter() - embed_start
+                writer.add(ids, texts, metadatas, vectors, signatures if dedup else None)
+                added += len(texts)
+                elapsed = time.perf_counter() - start
+                print(f"  {added} chunks embedded ({added / elapsed:.1f} chunks/sec)")
+            elapsed = time.perf_counter() - start
+            print(f"✓ Embedded {added} chunks in {elapsed:.2f}s"
+                  + (f" ({added / elapsed:.1f} chunks/sec)" if added else ""))
+
+            referenced = {chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"]}
+            stale_ids = sorted(stale_candidates - referenced)
+            writer.delete(stale_ids)
+            touched = {chunk_id for name in changed for chunk_id in files[name]["chunk_ids"]}
+            writer.update_metadata(source_metadata(files, touched | (stale_candidates & referenced), data_path))
+            if dedup and dedup.stats["chunks"]:
+                skipped = dedup.duplicates
+                saved = skipped * embed_seconds / added if added else 0.0
+                print(f"✓ Skipped embedding {skipped} of {dedup.stats['chunks']} chunks already in the store "
+                      f"({dedup.stats['exact']} exact, {dedup.stats['near']} near; "
+                      f"dedup ratio {skipped / dedup.stats['chunks']:.1%}), saving ~{saved:.2f}s of embedding")
+
+            if manifest is None and not added:
+                writer.abort()
+                print("Error: The text files produced no chunks.")
+                sys.exit(1)
 
-        print("\n[4/4] Creating FAISS vector store...")
-        db = FAISS.from_documents(chunks, embeddings)
-        db.save_local(DB_FAISS_PATH)
-        print(f"✓ Vector store saved to {DB_FAISS_PATH}")
+            print("\n[4/4] Saving FAISS vector store...")
+            writer.commit({
+                "embedding_model": model_name,
+                "text_splitter": TEXT_SPLITTER_CONFIG,
+                "dedup": DEDUP_CONFIG,
+                "index": spec,
+                "files": files
+            })
+        except BaseException:
+            writer.abort()
+            raise
+        print(f"✓ Vector store version {writer.version} published to {db_path} ({writer.spec})")
+        print(f"✓ BM25 index built over {writer.lexical_stats[0]} chunks, {writer.lexical_stats[1]} terms")
+        print(f"✓ Chunks reused: {reused}, added: {added}, removed: {len(stale_ids)}")
+        own_mb, children_mb = peak_rss_mb()
+        print(f"✓ Peak RSS: {own_mb:.0f} MB (main), {children_mb:.0f} MB (largest split worker)")
 
         print("\n" + "=" * 60)
-        print("SUCCESS! Vector database created successfully.")
+        print("SUCCESS! Vector database updated successfully.")
         print("=" * 60)
 
     except Exception as e:
@@ -64,4 +269,21 @@ def create_vector_db():
 
 
 if __name__ == "__main__":
-    create_vector_db()
+    parser = argparse.ArgumentParser(description="Build or update the Nyay-Saathi vector store.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and rebuild every file.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=None,
+                        help=f"FAISS index to build (default: {INDEX_CONFIG['type']}).")
+    parser.add_argument("--batch-size", type=int, default=INGEST_CONFIG["batch_size"],
+                        help="Number of chunks embedded and indexed per batch.")
+    parser.add_argument("--workers", type=int, default=INGEST_CONFIG["workers"],
+                        help="Processes used for splitting (default: all cores).")
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_DEVICE,
+                        help=f"Embedding inference backend (default: {EMBEDDING_DEVICE}).")
+    args = parser.parse_args()
+    create_vector_db(
+        full_rebuild=args.full,
+        index_type=args.index_type,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        embedding_backend=args.embedding_backend
+    )
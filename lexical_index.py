@@ -0,0 +1,119 @@
+import json
+import os
+import re
+from array import array
+from collections import Counter
+import numpy as np
+from config import LEXICAL_INDEX_CONFIG
+
+
+LEXICAL_FILES = {
+    "terms": "bm25_terms.npy",
+    "offsets": "bm25_offsets.npy",
+    "postings": "bm25_postings.npy",
+    "weights": "bm25_weights.npy",
+    "chunk_ids": "bm25_chunk_ids.npy",
+    "meta": "bm25_meta.json"
+}
+
+MAX_TERM_LENGTH = 32
+
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been but by can could did do does for from had has
+have he her his how i if in into is it its me my no not of on or our she should so than that the
+their them then there these they this to was we were what when where which who will with would you
+your
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+SECTION_SUFFIX_PATTERN = re.compile(r"(\d+)-([a-z])\b")
+
+
+def tokenize(text):
+    text = SECTION_SUFFIX_PATTERN.sub(r"\1\2", text.lower())
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_PATTERN.findall(text) if token not in STOPWORDS]
+
+
+def build_lexical_index(rows, output_dir, k1=LEXICAL_INDEX_CONFIG["k1"], b=LEXICAL_INDEX_CONFIG["b"],
+                        max_postings_per_term=LEXICAL_INDEX_CONFIG["max_postings_per_term"]):
+    vocabulary = {}
+    chunk_ids, doc_lengths = array("q"), array("i")
+    posting_terms, posting_docs, posting_tfs = array("i"), array("i"), array("i")
+    for position, (chunk_id, text) in enumerate(rows):
+        counts = Counter(tokenize(text))
+        chunk_ids.append(chunk_id)
+        doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            posting_terms.append(vocabulary.setdefault(term, len(vocabulary)))
+            posting_docs.append(position)
+            posting_tfs.append(tf)
+
+    terms = sorted(vocabulary)
+    term_rank = np.empty(len(terms), dtype=np.int64)
+    term_rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+    posting_terms = term_rank[np.frombuffer(posting_terms, dtype=np.int32)]
+    posting_docs = np.frombuffer(posting_docs, dtype=np.int32)
+    tfs = np.frombuffer(posting_tfs, dtype=np.int32).astype(np.float32)
+    lengths = np.frombuffer(doc_lengths, dtype=np.int32).astype(np.float32)
+
+    num_docs = len(chunk_ids)
+    avg_length = float(lengths.mean()) if num_docs else 0.0
+    doc_freq = np.bincount(posting_terms, minlength=len(terms))
+    idf = np.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+    norm = k1 * (1 - b + b * lengths[posting_docs] / (avg_length or 1.0))
+    weights = idf[posting_terms] * tfs * (k1 + 1) / (tfs + norm)
+
+    order = np.lexsort((-weights, posting_terms))
+    posting_terms, posting_docs, weights = posting_terms[order], posting_docs[order], weights[order]
+    group_starts = np.concatenate(([0], np.cumsum(doc_freq)[:-1]))
+    keep = np.arange(len(order)) - group_starts[posting_terms] < max_postings_per_term
+    offsets = np.concatenate(([0], np.cumsum(np.minimum(doc_freq, max_postings_per_term)))).astype(np.int64)
+
+    np.save(os.path.join(output_dir, LEXICAL_FILES["terms"]), np.array(terms, dtype=f"<U{MAX_TERM_LENGTH}"))
+    np.save(os.path.join(output_dir, LEXICAL_FILES["offsets"]), offsets)
+    np.save(os.path.join(output_dir, LEXICAL_FILES["postings"]), posting_docs[keep])
+    np.save(os.path.join(output_dir, LEXICAL_FILES["weights"]), weights[keep].astype(np.float32))
+    np.save(os.path.join(output_dir, LEXICAL_FILES["chunk_ids"]), np.frombuffer(chunk_ids, dtype=np.int64))
+    with open(os.path.join(output_dir, LEXICAL_FILES["meta"]), "w", encoding="utf-8") as f:
+        json.dump({"num_docs": num_docs, "num_terms": len(terms), "avg_length": avg_length,
+                   "k1": k1, "b": b, "max_postings_per_term": max_postings_per_term}, f)
+    return num_docs, len(terms)
+
+
+def has_lexical_index(db_path):
+    return all(os.path.exists(os.path.join(db_path, name)) for name in LEXICAL_FILES.values())
+
+
+class LexicalIndex:
+    def __init__(self, db_path):
+        def load(name):
+            return np.load(os.path.join(db_path, LEXICAL_FILES[name]), mmap_mode="r")
+
+        self.terms = load("terms")
+        self.offsets = load("offsets")
+        self.postings = load("postings")
+        self.weights = load("weights")
+        self.chunk_ids = load("chunk_ids")
+
+    def _term_index(self, term):
+        i = int(np.searchsorted(self.terms, term))
+        if i < len(self.terms) and self.terms[i] == term:
+            return i
+        return None
+
+    def search(self, query, k, min_score=0.0):
+        docs, weights = [], []
+        for term in set(tokenize(query)):
+            i = self._term_index(term)
+            if i is None:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            docs.append(self.postings[start:end])
+            weights.append(self.weights[start:end])
+        if not docs:
+            return []
+
+        positions, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        top = np.argsort(-scores)[:k]
+        return [(int(self.chunk_ids[positions[i]]), float(scores[i])) for i in top if scores[i] > min_score]
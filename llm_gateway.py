@@ -0,0 +1,380 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass, replace
+from types import SimpleNamespace
+from typing import Any, Iterator, List, Optional
+import httpx
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from tracing import get_registry
+from config import LLM_GATEWAY_CONFIG, MODEL_NAME
+
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class GatewayError(Exception):
+    def __init__(self, status, message, retry_after=None, retryable=None):
+        super().__init__(f"{status}: {message}" if status else message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = (status is None or status in RETRYABLE_STATUSES) if retryable is None else retryable
+
+
+@dataclass
+class GatewayResponse:
+    text: str
+    usage_metadata: Any
+    attempts: int = 1
+    queued_ms: float = 0.0
+    coalesced: bool = False
+
+
+def usage_from_rest(usage):
+    usage = usage or {}
+    return SimpleNamespace(
+        prompt_token_count=usage.get("promptTokenCount"),
+        candidates_token_count=usage.get("candidatesTokenCount"),
+        total_token_count=usage.get("totalTokenCount")
+    )
+
+
+def candidate_text(payload):
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    return "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+
+
+def build_request(contents, model=MODEL_NAME, temperature=None, system_instruction=None):
+    parts = []
+    for part in contents if isinstance(contents, list) else [contents]:
+        if isinstance(part, str):
+            parts.append({"text": part})
+        else:
+            parts.append({"inline_data": {"mime_type": part["mime_type"],
+                                          "data": base64.b64encode(part["data"]).decode("ascii")}})
+    request = {"model": model, "contents": [{"role": "user", "parts": parts}]}
+    if temperature is not None:
+        request["generationConfig"] = {"temperature": temperature}
+    if system_instruction:
+        request["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+    return request
+
+
+def request_key(request):
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class GeminiHTTPBackend:
+    def __init__(self, base_url, api_key, timeout_s):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout_s = timeout_s
+        self._client = None
+
+    def _client_for_loop(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout_s,
+                headers={"x-goog-api-key": self.api_key or ""},
+                limits=httpx.Limits(max_connections=LLM_GATEWAY_CONFIG["max_in_flight"])
+            )
+        return self._client
+
+    def _url(self, request, method):
+        return f"{self.base_url}/v1beta/models/{request['model']}:{method}"
+
+    @staticmethod
+    def _body(request):
+        return {key: value for key, value in request.items() if key != "model"}
+
+    @staticmethod
+    def _error(response, body):
+        try:
+            message = json.loads(body)["error"]["message"]
+        except (ValueError, KeyError, TypeError):
+            message = body[:200] if body else response.reason_phrase
+        retry_after = response.headers.get("retry-after")
+        return GatewayError(response.status_code, message,
+                            float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+    async def generate(self, request):
+        try:
+            response = await self._client_for_loop().post(self._url(request, "generateContent"),
+                                                          json=self._body(request))
+        except httpx.TransportError as e:
+            raise GatewayError(None, f"{type(e).__name__}: {e}") from e
+        if response.status_code >= 400:
+            raise self._error(response, response.text)
+        payload = response.json()
+        return GatewayResponse(text=candidate_text(payload),
+                               usage_metadata=usage_from_rest(payload.get("usageMetadata")))
+
+    async def stream(self, request):
+        try:
+            async with self._client_for_loop().stream(
+                "POST", self._url(request, "streamGenerateContent"), params={"alt": "sse"}, json=self._body(request)
+            ) as response:
+                if response.status_code >= 400:
+                    raise self._error(response, (await response.aread()).decode("utf-8", "replace"))
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    payload = json.loads(line[5:])
+                    usage = payload.get("usageMetadata")
+                    yield candidate_text(payload), usage_from_rest(usage) if usage else None
+        except httpx.TransportError as e:
+            raise GatewayError(None, f"{type(e).__name__}: {e}") from e
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s, capacity):
+        self.rate = rate_per_s
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        backend,
+        requests_per_minute=LLM_GATEWAY_CONFIG["requests_per_minute"],
+        burst=LLM_GATEWAY_CONFIG["burst"],
+        max_in_flight=LLM_GATEWAY_CONFIG["max_in_flight"],
+        max_retries=LLM_GATEWAY_CONFIG["max_retries"],
+        base_delay_s=LLM_GATEWAY_CONFIG["base_delay_s"],
+        max_delay_s=LLM_GATEWAY_CONFIG["max_delay_s"],
+        timeout_s=LLM_GATEWAY_CONFIG["timeout_s"]
+    ):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.timeout_s = timeout_s
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0, "retries": 0, "failures": 0}
+        self._inflight = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+
+    def _count(self, name, **labels):
+        self.stats[name] += 1
+        registry = get_registry()
+        if registry is not None:
+            registry.add(f"nyay_llm_{name}_total", tuple(sorted(labels.items())), 1)
+
+    def _backoff(self, attempt, retry_after):
+        delay = random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2 ** attempt))
+        return max(delay, retry_after or 0)
+
+    async def _with_retries(self, call):
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            await self.bucket.acquire()
+            async with self.semaphore:
+                queued_ms = (time.perf_counter() - start) * 1000
+                self._count("upstream_calls")
+                try:
+                    return await call(attempt + 1, queued_ms)
+                except asyncio.TimeoutError:
+                    error = GatewayError(504, f"No response within {self.timeout_s:.0f}s")
+                except GatewayError as e:
+                    error = e
+            if not error.retryable or attempt == self.max_retries:
+                self._count("failures", status=str(error.status))
+                raise error
+            delay = self._backoff(attempt, error.retry_after)
+            self._count("retries", status=str(error.status))
+            logger.warning("LLM call failed with %s, retrying in %.1fs (attempt %d of %d)",
+                           error, delay, attempt + 1, self.max_retries)
+            await asyncio.sleep(delay)
+
+    async def agenerate(self, request):
+        self._count("requests")
+        key = request_key(request)
+        task = self._inflight.get(key)
+        if task is None:
+            async def call(attempts, queued_ms):
+                response = await asyncio.wait_for(self.backend.generate(request), self.timeout_s)
+                return replace(response, attempts=attempts, queued_ms=queued_ms)
+
+            task = asyncio.ensure_future(self._with_retries(call))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            return await asyncio.shield(task)
+
+        self._count("coalesced")
+        return replace(await asyncio.shield(task), coalesced=True)
+
+    async def astream(self, request):
+        self._count("requests")
+        chunks = asyncio.Queue()
+
+        async def call(attempts, queued_ms):
+            emitted = False
+            try:
+                async for chunk in self.backend.stream(request):
+                    emitted = True
+                    await chunks.put(chunk)
+            except GatewayError as e:
+                if emitted:
+                    raise GatewayError(e.status, str(e), retryable=False) from e
+                raise
+
+        task = asyncio.ensure_future(self._with_retries(call))
+        task.add_done_callback(lambda _: chunks.put_nowait(None))
+        try:
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+            await task
+        finally:
+            task.cancel()
+
+    def generate(self, request):
+        return asyncio.run_coroutine_threadsafe(self.agenerate(request), self._loop).result()
+
+    def generate_content(self, contents, model=MODEL_NAME, temperature=None):
+        return self.generate(build_request(contents, model, temperature))
+
+    def stream(self, request):
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self.astream(request):
+                    items.put(("chunk", chunk))
+                items.put(("done", None))
+            except Exception as e:
+                items.put(("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                kind, item = items.get()
+                if kind == "done":
+                    return
+                if kind == "error":
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.backend.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def configure_gateway(api_key=None, base_url=LLM_GATEWAY_CONFIG["base_url"]):
+    global _gateway
+    api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+    with _gateway_lock:
+        backend = _gateway.backend if _gateway is not None else None
+        if backend is None or backend.api_key != api_key or backend.base_url != base_url.rstrip("/"):
+            if _gateway is not None:
+                _gateway.close()
+            _gateway = LLMGateway(GeminiHTTPBackend(base_url, api_key, LLM_GATEWAY_CONFIG["timeout_s"]))
+        return _gateway
+
+
+def get_gateway():
+    with _gateway_lock:
+        if _gateway is not None:
+            return _gateway
+    return configure_gateway()
+
+
+def _to_request(messages, model, temperature):
+    system = "\n".join(str(message.content) for message in messages if isinstance(message, SystemMessage))
+    contents = [
+        {"role": "model" if isinstance(message, AIMessage) else "user", "parts": [{"text": str(message.content)}]}
+        for message in messages if not isinstance(message, SystemMessage)
+    ]
+    request = {"model": model, "contents": contents, "generationConfig": {"temperature": temperature}}
+    if system:
+        request["systemInstruction"] = {"parts": [{"text": system}]}
+    return request
+
+
+def _usage_dict(usage):
+    if usage is None or usage.prompt_token_count is None:
+        return None
+    input_tokens, output_tokens = usage.prompt_token_count, usage.candidates_token_count or 0
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": usage.total_token_count or input_tokens + output_tokens}
+
+
+class GatewayChatModel(BaseChatModel):
+    model_name: str = MODEL_NAME
+    temperature: float = 0.7
+    gateway: Optional[Any] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "gemini-gateway"
+
+    def _gateway(self):
+        return self.gateway or get_gateway()
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        response = self._gateway().generate(_to_request(messages, self.model_name, self.temperature))
+        message = AIMessage(content=response.text, usage_metadata=_usage_dict(response.usage_metadata),
+                            response_metadata={"attempts": response.attempts, "coalesced": response.coalesced})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        reported = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        for text, usage in self._gateway().stream(_to_request(messages, self.model_name, self.temperature)):
+            usage, delta = _usage_dict(usage), None
+            if usage is not None:
+                delta = {key: usage[key] - reported[key] for key in reported}
+                reported = usage
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=delta))
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import re
+from tracing import span
+from config import PROMPT_BUDGET_CONFIG, RAG_PROMPT_TEMPLATE
+
+
+logger = logging.getLogger(__name__)
+
+NO_DOCUMENT = "No document uploaded."
+DOCUMENT_SEPARATOR = "\n...\n"
+SENTENCE_END = re.compile(r"(?<=[.!?।])\s")
+STEP_PREFIX = re.compile(r"^(\d+[.)]|[-*•])\s*")
+
+
+def count_tokens(text):
+    ascii_chars = sum(1 for char in text if char < "\x80")
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars + 1) // 2
+
+
+def truncate_to_tokens(text, max_tokens, keep_end=False):
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 1:
+        return ""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[-middle:] if keep_end else text[:middle]) + 1 <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return "…" + text[len(text) - low:].lstrip() if keep_end else text[:low].rstrip() + "…"
+
+
+def summarize_turn(message, max_tokens):
+    lines = [line.strip() for line in message["content"].splitlines() if line.strip()]
+    if not lines:
+        return ""
+    if message["role"] == "assistant":
+        parts = [SENTENCE_END.split(lines[0], 1)[0]]
+        parts += [SENTENCE_END.split(STEP_PREFIX.sub("", line), 1)[0] for line in lines[1:] if STEP_PREFIX.match(line)]
+        text = "; ".join(parts)
+    else:
+        text = " ".join(lines)
+    return truncate_to_tokens(text, max_tokens)
+
+
+class PromptAssembler:
+    def __init__(self, total_tokens=PROMPT_BUDGET_CONFIG["total_tokens"],
+                 recent_turns=PROMPT_BUDGET_CONFIG["recent_turns"],
+                 recent_turn_tokens=PROMPT_BUDGET_CONFIG["recent_turn_tokens"],
+                 summary_tokens=PROMPT_BUDGET_CONFIG["summary_tokens"],
+                 max_history_turns=PROMPT_BUDGET_CONFIG["max_history_turns"],
+                 template=RAG_PROMPT_TEMPLATE):
+        self.total_tokens = total_tokens
+        self.recent_turns = recent_turns
+        self.recent_turn_tokens = recent_turn_tokens
+        self.summary_tokens = summary_tokens
+        self.max_history_turns = max_history_turns
+        self.template = template
+
+    def _summary(self, message, summaries):
+        key = f"{message['role']}:{self.summary_tokens}:{hashlib.sha1(message['content'].encode('utf-8')).hexdigest()}"
+        if summaries is None:
+            return summarize_turn(message, self.summary_tokens)
+        if key not in summaries:
+            summaries[key] = summarize_turn(message, self.summary_tokens)
+        return summaries[key]
+
+    @staticmethod
+    def _fill(pieces, budget):
+        chosen, used = [], 0
+        for piece in pieces:
+            tokens = count_tokens(piece)
+            if used + tokens > budget:
+                if not chosen and budget - used > 1:
+                    piece = truncate_to_tokens(piece, budget - used)
+                    chosen.append(piece)
+                    used += count_tokens(piece)
+                break
+            chosen.append(piece)
+            used += tokens
+        return chosen, used
+
+    def _split_history(self, chat_history):
+        turns = list(chat_history)[-self.max_history_turns:]
+        cut = max(len(turns) - self.recent_turns, 0)
+        return turns[:cut], turns[cut:]
+
+    def _recent_history(self, recent, budget):
+        lines, used = [], 0
+        for message in reversed(recent):
+            line = f"{message['role']}: {truncate_to_tokens(message['content'], self.recent_turn_tokens)}"
+            if used + count_tokens(line) > budget:
+                break
+            lines.insert(0, line)
+            used += count_tokens(line)
+        return lines, used
+
+    def _older_history(self, older, summaries, budget):
+        lines, used = [], 0
+        for message in reversed(older):
+            line = f"(earlier) {message['role']}: {self._summary(message, summaries)}"
+            if used + count_tokens(line) > budget:
+                break
+            lines.insert(0, line)
+            used += count_tokens(line)
+        return lines, used
+
+    def _document(self, document_context, budget):
+        if not document_context or document_context == NO_DOCUMENT:
+            return NO_DOCUMENT, {}
+        if isinstance(document_context, str):
+            return truncate_to_tokens(document_context, budget), {}
+        pieces = [doc.page_content for doc in document_context]
+        chosen, _ = self._fill(pieces, budget)
+        ordered = sorted(zip(document_context, chosen), key=lambda pair: pair[0].metadata.get("position", 0))
+        return DOCUMENT_SEPARATOR.join(text for _, text in ordered), {
+            "document_chunks": f"{len(chosen)}/{len(pieces)}"
+        }
+
+    def assemble(self, inputs):
+        question, language = inputs["question"], inputs["language"]
+        docs = inputs.get("context") or []
+        chat_history = inputs.get("chat_history") or []
+        with span("prompt_budget") as opened:
+            overhead = count_tokens(self.template.format(context="", document_context="", chat_history="",
+                                                         question=question, language=language))
+            remaining = max(self.total_tokens - overhead, 0)
+            recent_budget = min(remaining // 2, self.recent_turns * (self.recent_turn_tokens + 4))
+
+            if isinstance(chat_history, str):
+                older = []
+                recent_text = truncate_to_tokens(chat_history, recent_budget, keep_end=True)
+                recent_lines, recent_used = [recent_text] if recent_text else [], count_tokens(recent_text)
+                recent = recent_lines
+            else:
+                older, recent = self._split_history(chat_history)
+                recent_lines, recent_used = self._recent_history(recent, recent_budget)
+            remaining -= recent_used
+
+            context_pieces, context_used = self._fill([doc.page_content for doc in docs], remaining)
+            remaining -= context_used
+
+            document, document_details = self._document(inputs.get("document_context"), remaining)
+            document_used = count_tokens(document) if document != NO_DOCUMENT else 0
+            remaining -= document_used
+
+            older_lines, older_used = [], 0
+            if len(recent_lines) == len(recent):
+                older_lines, older_used = self._older_history(older, inputs.get("history_summaries"), remaining)
+
+            slots = {"context": context_used, "document_context": document_used,
+                     "chat_history": recent_used + older_used}
+            total = overhead + sum(slots.values())
+            dropped = len(older) + len(recent) - len(recent_lines) - len(older_lines)
+            opened.set(input_tokens=total, budget_tokens=self.total_tokens, template_tokens=overhead,
+                       **{f"{name}_tokens": tokens for name, tokens in slots.items()},
+                       context_chunks=f"{len(context_pieces)}/{len(docs)}", history_verbatim=len(recent_lines),
+                       history_summarized=len(older_lines), history_dropped=dropped, **document_details)
+
+        logger.info("Prompt budget: %d of %d tokens (template+question %d, guides %d in %d/%d chunks, "
+                    "document %d, history %d: %d verbatim, %d summarized, %d dropped)",
+                    total, self.total_tokens, overhead, context_used, len(context_pieces), len(docs),
+                    document_used, slots["chat_history"], len(recent_lines), len(older_lines), dropped)
+        return {
+            "context": "\n\n".join(context_pieces),
+            "document_context": document,
+            "chat_history": "\n".join(older_lines + recent_lines),
+            "question": question,
+            "language": language
+        }
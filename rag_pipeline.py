@@ -1,68 +1,144 @@
+import logging
+import time
 import streamlit as st
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnableParallel
+from langchain_core.runnables import RunnableLambda, RunnableParallel
 from langchain_core.output_parsers import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
 from operator import itemgetter
+from answer_cache import AnswerCache
+from embedding_backends import create_embeddings
+from llm_gateway import GatewayChatModel
+from prompt_budget import PromptAssembler
+from retrieval import HotSwapRetriever, HybridRetriever
+from retrieval_client import RemoteEmbeddings, RemoteRetriever, RetrievalClient
+from store_manager import VectorStoreManager
+from tracing import TracingCallbackHandler, current_trace, span
 from config import (
+    ANSWER_CACHE_CONFIG,
     DB_FAISS_PATH,
+    DOCUMENT_INDEX_CONFIG,
+    HYBRID_SEARCH_CONFIG,
     MODEL_NAME,
     RAG_CONFIG,
-    EMBEDDING_MODEL,
-    EMBEDDING_DEVICE,
+    RETRIEVAL_SERVER_CONFIG,
     RAG_PROMPT_TEMPLATE
 )
 
 
+logger = logging.getLogger(__name__)
+
+
+@st.cache_resource
+def get_local_embeddings():
+    return create_embeddings()
+
+
+@st.cache_resource
+def get_retrieval_client():
+    if not RETRIEVAL_SERVER_CONFIG["enabled"]:
+        return None
+    return RetrievalClient()
+
+
 @st.cache_resource
 def get_embeddings():
-    return HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL,
-        model_kwargs={"device": EMBEDDING_DEVICE}
-    )
+    client = get_retrieval_client()
+    if client is None:
+        return get_local_embeddings()
+    return RemoteEmbeddings(client, fallback=get_local_embeddings)
 
 
 @st.cache_resource
-def get_vector_db():
-    embeddings = get_embeddings()
+def get_vector_store_manager():
+    embeddings = get_local_embeddings()
     try:
-        db = FAISS.load_local(
-            DB_FAISS_PATH,
-            embeddings,
-            allow_dangerous_deserialization=True
-        )
-        return db
+        return VectorStoreManager(DB_FAISS_PATH, embeddings, create_retriever)
     except Exception as e:
-        st.error(f"Error loading vector store: {e}")
-        st.error("Did you run 'ingest.py' and push the 'vectorstores' folder to GitHub?")
-        st.stop()
+        raise RuntimeError(
+            f"Error loading vector store: {e}. Did you run 'ingest.py' and push the 'vectorstores' folder to GitHub?"
+        ) from e
 
 
 @st.cache_resource
 def get_llm():
-    return ChatGoogleGenerativeAI(model=MODEL_NAME, temperature=0.7)
+    return GatewayChatModel(model_name=MODEL_NAME, temperature=0.7)
 
 
 @st.cache_resource
-def get_retriever():
-    db = get_vector_db()
-    return db.as_retriever(
-        search_type=RAG_CONFIG["search_type"],
-        search_kwargs=RAG_CONFIG["search_kwargs"]
+def get_answer_cache():
+    return AnswerCache(**ANSWER_CACHE_CONFIG)
+
+
+def create_retriever(db, lexical_index=None):
+    if not HYBRID_SEARCH_CONFIG["enabled"]:
+        return db.as_retriever(
+            search_type=RAG_CONFIG["search_type"],
+            search_kwargs=RAG_CONFIG["search_kwargs"]
+        )
+    return HybridRetriever(
+        vectorstore=db,
+        lexical_index=lexical_index,
+        k=RAG_CONFIG["search_kwargs"]["k"],
+        score_threshold=RAG_CONFIG["search_kwargs"]["score_threshold"],
+        fetch_k=HYBRID_SEARCH_CONFIG["fetch_k"],
+        rrf_k=HYBRID_SEARCH_CONFIG["rrf_k"],
+        min_lexical_score=HYBRID_SEARCH_CONFIG["min_lexical_score"]
     )
 
 
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+def get_local_retriever():
+    return HotSwapRetriever(manager=get_vector_store_manager())
 
 
 @st.cache_resource
-def build_rag_chain():
-    retriever = get_retriever()
-    llm = get_llm()
+def get_retriever():
+    client = get_retrieval_client()
+    if client is None:
+        return get_local_retriever()
+    return RemoteRetriever(client=client, fallback=get_local_retriever)
+
+
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def build_document_index(raw_text):
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=DOCUMENT_INDEX_CONFIG["chunk_size"],
+        chunk_overlap=DOCUMENT_INDEX_CONFIG["chunk_overlap"]
+    )
+    chunks = text_splitter.split_text(raw_text)
+    if not chunks:
+        return None
+    return FAISS.from_texts(
+        chunks,
+        get_embeddings(),
+        metadatas=[{"position": i} for i in range(len(chunks))]
+    )
+
+
+@st.cache_resource(max_entries=DOCUMENT_INDEX_CONFIG["max_cached_indexes"], show_spinner=False)
+def get_document_index(document_hash, _raw_text):
+    return build_document_index(_raw_text)
+
+
+def retrieve_document_context(document_index, question, full_text, k=DOCUMENT_INDEX_CONFIG["k"]):
+    with span("document_context") as opened:
+        docs = document_index.similarity_search(question, k=k)
+        opened.set(documents=len(docs))
+    full_tokens = estimate_tokens(full_text)
+    used_tokens = sum(estimate_tokens(doc.page_content) for doc in docs)
+    logger.info("Document context: %d of %d chunks, ~%d tokens instead of ~%d (saved ~%d)",
+                len(docs), document_index.index.ntotal, used_tokens, full_tokens,
+                max(full_tokens - used_tokens, 0))
+    return docs
+
+
+def create_rag_chain(retriever, llm, assembler=None):
     rag_prompt = PromptTemplate.from_template(RAG_PROMPT_TEMPLATE)
+    assembler = assembler or PromptAssembler()
 
     rag_chain_with_sources = RunnableParallel(
         {
@@ -70,17 +146,12 @@ def build_rag_chain():
             "question": itemgetter("question"),
             "language": itemgetter("language"),
             "chat_history": itemgetter("chat_history"),
-            "document_context": itemgetter("document_context")
+            "document_context": itemgetter("document_context"),
+            "history_summaries": (lambda x: x.get("history_summaries"))
         }
     ) | {
         "answer": (
-            {
-                "context": (lambda x: format_docs(x["context"])),
-                "question": itemgetter("question"),
-                "language": itemgetter("language"),
-                "chat_history": itemgetter("chat_history"),
-                "document_context": itemgetter("document_context")
-            }
+            RunnableLambda(assembler.assemble)
             | rag_prompt
             | llm
             | StrOutputParser()
@@ -89,3 +160,33 @@ def build_rag_chain():
     }
 
     return rag_chain_with_sources
+
+
+@st.cache_resource
+def build_rag_chain():
+    return create_rag_chain(get_retriever(), get_llm())
+
+
+def stream_rag_answer(rag_chain, payload, result, on_sources=None):
+    start = time.perf_counter()
+    result["answer"] = ""
+    result["sources"] = []
+    result["ttft_ms"] = None
+
+    trace = current_trace()
+    config = {"callbacks": [TracingCallbackHandler(trace)]} if trace is not None else None
+    for chunk in rag_chain.stream(payload, config=config):
+        if "sources" in chunk:
+            result["sources"] = chunk["sources"]
+            if on_sources is not None:
+                on_sources(chunk["sources"])
+        token = chunk.get("answer")
+        if token:
+            if result["ttft_ms"] is None:
+                result["ttft_ms"] = (time.perf_counter() - start) * 1000
+                logger.info("RAG answer time-to-first-token: %.0f ms", result["ttft_ms"])
+            result["answer"] += token
+            yield token
+
+    logger.info("RAG answer streamed in %.0f ms (%d chars)", (time.perf_counter() - start) * 1000,
+                len(result["answer"]))
@@ -0,0 +1,82 @@
+from typing import Any, List, Optional
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from tracing import span
+from vector_store import relevance_scores
+
+
+def reciprocal_rank_fusion(ranked_lists, rrf_k):
+    scores, docs = {}, {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    vectorstore: Any
+    lexical_index: Optional[Any] = None
+    k: int = 3
+    score_threshold: float = 0.3
+    fetch_k: int = 20
+    rrf_k: int = 60
+    min_lexical_score: float = 0.0
+
+    def dense_search_by_vectors(self, vectors):
+        store = self.vectorstore
+        with span("faiss_search", queries=len(vectors)) as opened:
+            distances, indices = store.index.search(np.asarray(vectors, dtype=np.float32), self.fetch_k)
+            scores = relevance_scores(store.index, distances)
+            results = []
+            for row_scores, row_indices in zip(scores, indices):
+                docs = [store.docstore.search(store.index_to_docstore_id[int(i)])
+                        for score, i in zip(row_scores, row_indices)
+                        if i != -1 and score >= self.score_threshold]
+                results.append([doc for doc in docs if isinstance(doc, Document)])
+            opened.set(documents=sum(len(docs) for docs in results))
+        return results
+
+    def dense_search(self, query):
+        with span("embed_query"):
+            vector = self.vectorstore.embeddings.embed_query(query)
+        return self.dense_search_by_vectors([vector])[0]
+
+    def lexical_search(self, query):
+        if self.lexical_index is None:
+            return []
+        with span("bm25_search") as opened:
+            hits = self.lexical_index.search(query, self.fetch_k, self.min_lexical_score)
+            docs = [self.vectorstore.docstore.search(chunk_id) for chunk_id, _ in hits]
+            docs = [doc for doc in docs if isinstance(doc, Document)]
+            opened.set(documents=len(docs))
+        return docs
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        fused = reciprocal_rank_fusion([self.dense_search(query), self.lexical_search(query)], self.rrf_k)
+        return fused[:self.k]
+
+    def search_batch(self, queries, vectors):
+        return [
+            reciprocal_rank_fusion([dense, self.lexical_search(query)], self.rrf_k)[:self.k]
+            for query, dense in zip(queries, self.dense_search_by_vectors(vectors))
+        ]
+
+
+class HotSwapRetriever(BaseRetriever):
+    manager: Any
+
+    @property
+    def version(self):
+        return self.manager.version
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with self.manager.lease() as snapshot:
+            return snapshot.retriever._get_relevant_documents(query, run_manager=run_manager)
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from typing import Any, List
+import httpx
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from tracing import span
+from config import EMBEDDING_MODEL, RETRIEVAL_SERVER_CONFIG
+
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalServerUnavailable(Exception):
+    pass
+
+
+class RetrievalClient:
+    def __init__(self, socket_path=RETRIEVAL_SERVER_CONFIG["socket_path"], host=RETRIEVAL_SERVER_CONFIG["host"],
+                 port=RETRIEVAL_SERVER_CONFIG["port"], timeout_s=RETRIEVAL_SERVER_CONFIG["timeout_s"],
+                 retry_after_s=RETRIEVAL_SERVER_CONFIG["retry_after_s"]):
+        if socket_path:
+            transport, base_url = httpx.HTTPTransport(uds=socket_path), "http://retrieval"
+        else:
+            transport, base_url = None, f"http://{host}:{port}"
+        self._client = httpx.Client(base_url=base_url, transport=transport, timeout=timeout_s)
+        self.retry_after_s = retry_after_s
+        self.version = None
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    def _request(self, method, path, payload=None):
+        if time.monotonic() < self._down_until:
+            raise RetrievalServerUnavailable("retrieval server marked unavailable")
+        try:
+            response = self._client.request(method, path, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            with self._lock:
+                first_failure = self._down_until == 0.0
+                self._down_until = time.monotonic() + self.retry_after_s
+            if first_failure:
+                logger.warning("Retrieval server unavailable (%s); using in-process retrieval", e)
+            raise RetrievalServerUnavailable(str(e)) from e
+
+        with self._lock:
+            if self._down_until:
+                logger.info("Retrieval server is back")
+            self._down_until = 0.0
+        body = response.json()
+        if "version" in body:
+            self.version = body["version"]
+        return body
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def retrieve(self, query):
+        return self._request("POST", "/retrieve", {"query": query})
+
+    def embed_query(self, text):
+        return self._request("POST", "/embed_query", {"text": text})["vector"]
+
+    def embed_documents(self, texts):
+        return self._request("POST", "/embed_documents", {"texts": texts})["vectors"]
+
+    def close(self):
+        self._client.close()
+
+
+class RemoteRetriever(BaseRetriever):
+    client: Any
+    fallback: Any
+
+    @property
+    def version(self):
+        if self.client.version is None:
+            try:
+                self.client.health()
+            except RetrievalServerUnavailable:
+                return self.fallback().version
+        return self.client.version
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        try:
+            with span("remote_retrieval") as opened:
+                body = self.client.retrieve(query)
+                opened.set(documents=len(body["documents"]), batch_size=body["batch_size"],
+                           queue_ms=body["queue_ms"], batch_ms=body["batch_ms"])
+        except RetrievalServerUnavailable:
+            return self.fallback()._get_relevant_documents(query, run_manager=run_manager)
+        return [Document(**doc) for doc in body["documents"]]
+
+
+class RemoteEmbeddings(Embeddings):
+    def __init__(self, client, fallback, model_name=EMBEDDING_MODEL):
+        self.client = client
+        self.fallback = fallback
+        self.model_name = model_name
+
+    def embed_query(self, text):
+        try:
+            return self.client.embed_query(text)
+        except RetrievalServerUnavailable:
+            return self.fallback().embed_query(text)
+
+    def embed_documents(self, texts):
+        try:
+            return self.client.embed_documents(texts)
+        except RetrievalServerUnavailable:
+            return self.fallback().embed_documents(texts)
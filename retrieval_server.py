@@ -0,0 +1,228 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from embedding_backends import EMBEDDING_BACKENDS, create_embeddings
+from retrieval import HybridRetriever
+from config import (
+    DB_FAISS_PATH,
+    EMBEDDING_DEVICE,
+    EMBEDDING_MODEL,
+    HYBRID_SEARCH_CONFIG,
+    RAG_CONFIG,
+    RETRIEVAL_SERVER_CONFIG
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def create_server_retriever(db, lexical_index=None):
+    return HybridRetriever(
+        vectorstore=db,
+        lexical_index=lexical_index if HYBRID_SEARCH_CONFIG["enabled"] else None,
+        k=RAG_CONFIG["search_kwargs"]["k"],
+        score_threshold=RAG_CONFIG["search_kwargs"]["score_threshold"],
+        fetch_k=HYBRID_SEARCH_CONFIG["fetch_k"],
+        rrf_k=HYBRID_SEARCH_CONFIG["rrf_k"],
+        min_lexical_score=HYBRID_SEARCH_CONFIG["min_lexical_score"]
+    )
+
+
+def document_to_json(doc):
+    return {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}
+
+
+class MicroBatcher:
+    def __init__(self, handler, max_batch_size, max_wait_ms):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.stats = {"batches": 0, "items": 0, "largest_batch": 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.handler(items)
+            except Exception as e:
+                logger.exception("Batch of %d failed", len(batch))
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            batch_ms = (time.perf_counter() - started) * 1000
+            for (_, future, queued), result in zip(batch, results):
+                future.set_result({**result, "batch_size": len(batch), "batch_ms": batch_ms,
+                                   "queue_ms": (started - queued) * 1000})
+
+
+class RetrievalService:
+    def __init__(self, manager, embeddings, max_batch_size=RETRIEVAL_SERVER_CONFIG["max_batch_size"],
+                 max_wait_ms=RETRIEVAL_SERVER_CONFIG["max_wait_ms"]):
+        self.manager = manager
+        self.embeddings = embeddings
+        self.batcher = MicroBatcher(self._run_batch, max_batch_size, max_wait_ms)
+
+    def _run_batch(self, items):
+        vectors = self.embeddings.embed_documents([text for _, text in items])
+        searches = [i for i, (kind, _) in enumerate(items) if kind == "retrieve"]
+        results = [{"vector": vector} for vector in vectors]
+        if searches:
+            with self.manager.lease() as snapshot:
+                found = snapshot.retriever.search_batch([items[i][1] for i in searches],
+                                                        [vectors[i] for i in searches])
+                for i, docs in zip(searches, found):
+                    results[i] = {"documents": [document_to_json(doc) for doc in docs],
+                                  "version": snapshot.version}
+        return results
+
+    def retrieve(self, query):
+        return self.batcher.submit(("retrieve", query))
+
+    def embed_query(self, text):
+        return self.batcher.submit(("embed", text))
+
+    def embed_documents(self, texts):
+        return {"vectors": self.embeddings.embed_documents(texts)}
+
+    def health(self):
+        return {"status": "ok", "version": self.manager.version, "model": EMBEDDING_MODEL, **self.batcher.stats}
+
+
+def make_handler(service):
+    routes = {
+        "/retrieve": lambda body: service.retrieve(body["query"]),
+        "/embed_query": lambda body: service.embed_query(body["text"]),
+        "/embed_documents": lambda body: service.embed_documents(body["texts"])
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send_json(404, {"error": "Unknown endpoint"})
+                return
+            self._send_json(200, service.health())
+
+        def do_POST(self):
+            route = routes.get(self.path)
+            if route is None:
+                self._send_json(404, {"error": "Unknown endpoint"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                self._send_json(200, route(body))
+            except (KeyError, ValueError) as e:
+                self._send_json(400, {"error": f"Bad request: {e}"})
+            except Exception as e:
+                logger.exception("Retrieval request failed")
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def create_server(service, socket_path=None, host="127.0.0.1", port=0):
+    handler = make_handler(service)
+    if socket_path:
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    server = ThreadingHTTPServer((host, port), handler, bind_and_activate=False)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    server.server_bind()
+    server.server_activate()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve guide retrieval and query embeddings to every app worker on this machine."
+    )
+    parser.add_argument("--db", default=DB_FAISS_PATH)
+    parser.add_argument("--socket", default=RETRIEVAL_SERVER_CONFIG["socket_path"],
+                        help="Unix socket to listen on. Pass an empty string to listen on --host/--port.")
+    parser.add_argument("--host", default=RETRIEVAL_SERVER_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=RETRIEVAL_SERVER_CONFIG["port"])
+    parser.add_argument("--max-batch-size", type=int, default=RETRIEVAL_SERVER_CONFIG["max_batch_size"])
+    parser.add_argument("--max-wait-ms", type=float, default=RETRIEVAL_SERVER_CONFIG["max_wait_ms"])
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_DEVICE,
+                        help=f"Embedding inference backend (default: {EMBEDDING_DEVICE}).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from store_manager import VectorStoreManager
+
+    print("[1/3] Loading embedding model...")
+    embeddings = create_embeddings(args.embedding_backend)
+    print("[2/3] Loading vector store...")
+    manager = VectorStoreManager(args.db, embeddings, create_server_retriever)
+    print(f"✓ Serving version {manager.version or 'unversioned'}")
+
+    service = RetrievalService(manager, embeddings, args.max_batch_size, args.max_wait_ms)
+    server = create_server(service, args.socket, args.host, args.port)
+    where = args.socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"[3/3] Listening on {where} (batches of up to {args.max_batch_size}, waiting up to {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
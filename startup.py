@@ -0,0 +1,80 @@
+import importlib
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+PROCESS_START = time.perf_counter()
+
+WARMUP_MODULES = ("tracing", "llm_gateway", "answer_cache", "document_processor", "rag_pipeline")
+
+
+class Startup:
+    def __init__(self):
+        self.state = "idle"
+        self.error = None
+        self.timings = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def mark_first_paint(self, script_start, imports_done):
+        with self._lock:
+            if "first_paint_ms" in self.timings:
+                return
+            self.timings["import_ms"] = (imports_done - script_start) * 1000
+            self.timings["first_paint_ms"] = (time.perf_counter() - script_start) * 1000
+        logger.info("Startup: imports %.0f ms, first paint %.0f ms",
+                    self.timings["import_ms"], self.timings["first_paint_ms"])
+
+    def start_warmup(self, api_key):
+        with self._lock:
+            if self._thread is not None or self.state == "ready":
+                return
+            self.state = "running"
+            self.error = None
+            self._thread = threading.Thread(target=self._warm_up, args=(api_key,), name="warm-up", daemon=True)
+            self._thread.start()
+
+    def _stage(self, name, load):
+        start = time.perf_counter()
+        load()
+        self.timings[f"warmup_{name}_ms"] = (time.perf_counter() - start) * 1000
+
+    def _warm_up(self, api_key):
+        start = time.perf_counter()
+        try:
+            self._stage("imports", lambda: [importlib.import_module(name) for name in WARMUP_MODULES])
+            from llm_gateway import configure_gateway
+            from rag_pipeline import build_rag_chain, get_embeddings, get_retriever
+            from tracing import start_metrics_server
+
+            self._stage("gateway", lambda: (configure_gateway(api_key=api_key), start_metrics_server()))
+            self._stage("embeddings", get_embeddings)
+            self._stage("retriever", get_retriever)
+            self._stage("rag_chain", build_rag_chain)
+        except Exception as e:
+            with self._lock:
+                self.state = "failed"
+                self.error = f"{type(e).__name__}: {e}"
+                self._thread = None
+            logger.exception("Background warm-up failed; resources will load on first use")
+            return
+
+        with self._lock:
+            self.timings["warmup_ms"] = (time.perf_counter() - start) * 1000
+            self.timings["ready_ms"] = (time.perf_counter() - PROCESS_START) * 1000
+            self.state = "ready"
+            self._thread = None
+        logger.info("Startup: ready %.0f ms after the first run (warm-up %.0f ms: %s)",
+                    self.timings["ready_ms"], self.timings["warmup_ms"],
+                    ", ".join(f"{name[7:-3]} {ms:.0f} ms" for name, ms in self.timings.items()
+                              if name.startswith("warmup_") and name != "warmup_ms"))
+
+    def report(self):
+        with self._lock:
+            return {"state": self.state, "error": self.error, **self.timings}
+
+
+STARTUP = Startup()
@@ -0,0 +1,125 @@
+import gc
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from lexical_index import LexicalIndex, has_lexical_index
+from vector_store import current_version, load_vector_store
+from config import HOT_RELOAD_CONFIG, MANIFEST_FILE
+
+
+logger = logging.getLogger(__name__)
+
+
+class StoreSnapshot:
+    def __init__(self, version, vectorstore, lexical_index, retriever):
+        self.version = version
+        self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.retriever = retriever
+        self._leases = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._leases += 1
+
+    def release(self):
+        with self._lock:
+            self._leases -= 1
+            idle = self._retired and self._leases == 0
+        if idle:
+            self._close()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            idle = self._leases == 0
+        if idle:
+            self._close()
+
+    def _close(self):
+        docstore = getattr(self.vectorstore, "docstore", None)
+        if hasattr(docstore, "close"):
+            docstore.close()
+        self.vectorstore = self.lexical_index = self.retriever = None
+        gc.collect()
+        logger.info("Released vector store version %s", self.version or "unversioned")
+
+
+class VectorStoreManager:
+    def __init__(self, db_path, embeddings, build_retriever,
+                 check_interval_s=HOT_RELOAD_CONFIG["check_interval_s"]):
+        self.db_path = db_path
+        self.embeddings = embeddings
+        self.build_retriever = build_retriever
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._loading = None
+        self._failed_version = None
+        self._last_check = time.monotonic()
+        self.current = self._load(*current_version(db_path))
+
+    @property
+    def version(self):
+        return self.current.version
+
+    def _load(self, version, path):
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                built_with = json.load(f).get("embedding_model")
+            expected = getattr(self.embeddings, "model_name", None)
+            if built_with and expected and built_with != expected:
+                raise ValueError(f"version {version} was built with {built_with}, but the app embeds with {expected}")
+
+        vectorstore = load_vector_store(path, self.embeddings)
+        lexical_index = LexicalIndex(path) if has_lexical_index(path) else None
+        return StoreSnapshot(version, vectorstore, lexical_index, self.build_retriever(vectorstore, lexical_index))
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_check < self.check_interval_s or self._loading is not None:
+                return
+            self._last_check = now
+            version, path = current_version(self.db_path)
+            if version is None or version in (self.current.version, self._failed_version):
+                return
+            self._loading = threading.Thread(target=self._reload, args=(version, path),
+                                             name="vector-store-reload", daemon=True)
+            self._loading.start()
+
+    def _reload(self, version, path):
+        start = time.perf_counter()
+        try:
+            snapshot = self._load(version, path)
+            snapshot.retriever.invoke("warm up")
+        except Exception:
+            logger.exception("Could not load vector store version %s; still serving %s",
+                             version, self.current.version or "unversioned")
+            with self._lock:
+                self._failed_version = version
+                self._loading = None
+            return
+
+        with self._lock:
+            previous, self.current = self.current, snapshot
+            self._loading = None
+        logger.info("Swapped vector store %s -> %s after loading for %.0f ms",
+                    previous.version or "unversioned", version, (time.perf_counter() - start) * 1000)
+        previous.retire()
+
+    @contextmanager
+    def lease(self):
+        self.maybe_reload()
+        with self._lock:
+            snapshot = self.current
+            snapshot.acquire()
+        try:
+            yield snapshot
+        finally:
+            snapshot.release()
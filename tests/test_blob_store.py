@@ -0,0 +1,46 @@
+import threading
+from blob_store import BlobStore
+
+
+def make_store(path, **overrides):
+    options = {"max_bytes": 10 ** 9, "memory_bytes": 0, "idle_seconds": 3600, "sweep_interval_s": 60}
+    return BlobStore(str(path), **{**options, **overrides})
+
+
+def test_put_survives_concurrent_release_of_the_same_blob(tmp_path):
+    store = make_store(tmp_path)
+    data = b"x" * 100_000
+    stop = threading.Event()
+
+    def churn():
+        session_id = f"other-{threading.get_ident()}"
+        while not stop.is_set():
+            store.put(session_id, "document", data)
+            store.release(session_id)
+
+    threads = [threading.Thread(target=churn) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        missing = 0
+        for _ in range(1000):
+            blob_hash = store.put("mine", "document", data)
+            missing += store.get(blob_hash) is None
+            store.release("mine")
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert missing == 0
+
+
+def test_release_deletes_only_unreferenced_blobs(tmp_path):
+    store = make_store(tmp_path)
+    shared = store.put("a", "upload", b"same file")
+    store.put("b", "upload", b"same file")
+    own = store.put_text("a", "document_text", "only in a")
+
+    store.release("a")
+    assert store.get(shared) == b"same file"
+    assert store.get(own) is None
+    assert store.stats()["blobs"] == 1
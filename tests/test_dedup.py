@@ -0,0 +1,40 @@
+from dedup import NearDuplicateIndex
+
+
+PARAGRAPH = (
+    "If a shopkeeper sells you a defective product or refuses to honour a warranty, you can file a complaint "
+    "with the District Consumer Disputes Redressal Commission. You must file it within 30 days of noticing "
+    "the defect, along with a copy of the bill and any written replies from the seller. For free help "
+    "drafting the complaint, call the National Consumer Helpline on 15100 between 9:30 AM and 5:30 PM, "
+    "Monday to Saturday, or register it online at consumerhelpline.gov.in."
+)
+
+
+def add_pair(first, second):
+    index = NearDuplicateIndex()
+    assert index.add("first", index.prepare(first)) is None
+    return index, index.add("second", index.prepare(second))
+
+
+def test_reworded_paragraph_is_a_near_duplicate():
+    index, representative = add_pair(PARAGRAPH, PARAGRAPH.replace("a copy of", "a photocopy of"))
+    assert representative == "first"
+    assert index.stats["near"] == 1
+
+
+def test_changed_deadline_is_kept():
+    index, representative = add_pair(PARAGRAPH, PARAGRAPH.replace("30 days", "90 days"))
+    assert representative is None
+    assert index.stats["near"] == 0
+
+
+def test_changed_helpline_number_is_kept():
+    index, representative = add_pair(PARAGRAPH, PARAGRAPH.replace("15100", "15200"))
+    assert representative is None
+    assert index.stats["near"] == 0
+
+
+def test_numbers_are_ignored_when_disabled():
+    index = NearDuplicateIndex(match_numbers=False)
+    index.add("first", index.prepare(PARAGRAPH))
+    assert index.add("second", index.prepare(PARAGRAPH.replace("30 days", "90 days"))) == "first"
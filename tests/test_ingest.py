@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import pytest
+from config import DOCSTORE_FILE, VERSIONS_DIR
+from fakes import HashingEmbeddings
+from ingest import create_vector_db
+from vector_store import current_version
+
+GUIDES = {
+    "tenancy.txt": "A landlord must give a written notice of 30 days before asking a tenant to leave. "
+                   "The notice must state the reason, and the tenant can ask the Rent Controller to review it.",
+    "wages.txt": "An employer must pay wages before the seventh day after the end of the wage period. "
+                 "Deductions for fines are allowed only for acts listed in the approved notice."
+}
+
+
+class FailingEmbeddings(HashingEmbeddings):
+    def embed_documents(self, texts):
+        raise RuntimeError("embedding backend crashed")
+
+
+def write_guides(data_path, guides):
+    os.makedirs(data_path, exist_ok=True)
+    for name, text in guides.items():
+        with open(os.path.join(data_path, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def ingest(data_path, db_path, embeddings=None):
+    create_vector_db(data_path=data_path, db_path=db_path, workers=1, embeddings=embeddings or HashingEmbeddings())
+
+
+def version_dirs(db_path):
+    return sorted(os.listdir(os.path.join(db_path, VERSIONS_DIR)))
+
+
+def test_failed_incremental_run_leaves_no_temp_version(tmp_path):
+    data_path, db_path = str(tmp_path / "data"), str(tmp_path / "db")
+    write_guides(data_path, GUIDES)
+    ingest(data_path, db_path)
+    published = version_dirs(db_path)
+
+    write_guides(data_path, {"wages.txt": GUIDES["wages.txt"] + " Overtime is paid at twice the ordinary rate."})
+    with pytest.raises(SystemExit):
+        ingest(data_path, db_path, FailingEmbeddings())
+    assert version_dirs(db_path) == published
+
+
+def test_commit_removes_abandoned_temp_versions(tmp_path):
+    data_path, db_path = str(tmp_path / "data"), str(tmp_path / "db")
+    write_guides(data_path, GUIDES)
+    ingest(data_path, db_path)
+    os.makedirs(os.path.join(db_path, VERSIONS_DIR, "20200101T000000-abcdef.tmp"))
+
+    write_guides(data_path, {"wages.txt": GUIDES["wages.txt"] + " Overtime is paid at twice the ordinary rate."})
+    ingest(data_path, db_path)
+    assert not [name for name in version_dirs(db_path) if name.endswith(".tmp")]
+
+
+def test_edited_chunk_replaces_its_old_version(tmp_path):
+    paragraph = ("If a shopkeeper sells you a defective product or refuses to honour a warranty, you can file a "
+                 "complaint with the District Consumer Disputes Redressal Commission. Attach a copy of the bill and "
+                 "any written replies from the seller, and keep the receipt the commission gives you. The "
+                 "commission can order a replacement, a refund or compensation for the trouble you were caused.")
+    data_path, db_path = str(tmp_path / "data"), str(tmp_path / "db")
+    write_guides(data_path, {**GUIDES, "consumer.txt": paragraph})
+    ingest(data_path, db_path)
+
+    edited = paragraph.replace("keep the receipt", "keep the acknowledgement")
+    write_guides(data_path, {"consumer.txt": edited})
+    ingest(data_path, db_path)
+
+    _, store_path = current_version(db_path)
+    conn = sqlite3.connect(f"file:{store_path}/{DOCSTORE_FILE}?mode=ro", uri=True)
+    try:
+        texts = {row[0] for row in conn.execute("SELECT page_content FROM chunks")}
+    finally:
+        conn.close()
+    assert edited in texts
+    assert paragraph not in texts
@@ -0,0 +1,41 @@
+import logging
+import math
+import faiss
+import numpy as np
+import pytest
+from vector_store import apply_search_params, build_index, relevance_scores
+
+VECTORS = np.random.default_rng(0).random((500, 16), dtype=np.float32)
+
+
+def trained_index(spec):
+    index = build_index(16, spec)
+    if not index.is_trained:
+        index.train(VECTORS)
+    return index
+
+
+def test_search_params_for_other_index_types_are_skipped_quietly(caplog):
+    ivf = trained_index({"type": "ivf", "nlist": 8})
+    hnsw = trained_index({"type": "hnsw", "M": 16, "ef_construction": 40})
+    with caplog.at_level(logging.WARNING):
+        apply_search_params(ivf, {"nprobe": 4, "efSearch": 64})
+        apply_search_params(hnsw, {"nprobe": 4, "efSearch": 64})
+    assert faiss.extract_index_ivf(ivf).nprobe == 4
+    assert faiss.downcast_index(hnsw.index).hnsw.efSearch == 64
+    assert not caplog.records
+
+
+def test_unknown_search_param_is_logged(caplog):
+    ivf = trained_index({"type": "ivf", "nlist": 8})
+    with caplog.at_level(logging.WARNING):
+        apply_search_params(ivf, {"nprob": 4})
+    assert faiss.extract_index_ivf(ivf).nprobe == 1
+    assert "could not set parameter nprob" in caplog.text
+
+
+def test_relevance_matches_euclidean_scoring():
+    index = trained_index({"type": "flat"})
+    assert np.allclose(relevance_scores(index, [[0.0, math.sqrt(2)]]), [[1.0, 0.0]])
+    with pytest.raises(ValueError):
+        relevance_scores(faiss.IndexFlatIP(16), [[0.5]])
@@ -0,0 +1,302 @@
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.callbacks import BaseCallbackHandler
+from config import TRACING_CONFIG
+
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar("nyay_saathi_trace", default=None)
+
+
+def approx_tokens(text):
+    return (len(text) + 3) // 4
+
+
+class Span:
+    def __init__(self, name, start, attributes):
+        self.name = name
+        self.start = start
+        self.end = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, name, registry=None):
+        self.name = name
+        self.registry = registry
+        self.spans = []
+        self.start = None
+        self.end = None
+        self.error = None
+        self._token = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        _current_trace.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        registry = self.registry or get_registry()
+        if registry is not None:
+            registry.observe_trace(self)
+        logger.info("Trace %s: %s", self.name, self.format())
+        return False
+
+    def open_span(self, name, **attributes):
+        span = Span(name, time.perf_counter(), attributes)
+        self.spans.append(span)
+        return span
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def format(self):
+        parts = [f"total={self.duration_ms:.0f}ms"]
+        parts += [f"{span.name}={span.duration_ms:.0f}ms" for span in self.spans]
+        return " ".join(parts) + (f" error={self.error}" if self.error else "")
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "total_ms": self.duration_ms,
+            "error": self.error,
+            "spans": [
+                {"name": span.name, "offset_ms": (span.start - self.start) * 1000,
+                 "duration_ms": span.duration_ms, **span.attributes}
+                for span in self.spans
+            ]
+        }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    trace = _current_trace.get()
+    if trace is None:
+        yield NOOP_SPAN
+        return
+    opened = trace.open_span(name, **attributes)
+    try:
+        yield opened
+    except Exception as e:
+        opened.set(error=type(e).__name__)
+        raise
+    finally:
+        opened.end = time.perf_counter()
+
+
+def record_genai_usage(opened, response):
+    usage = getattr(response, "usage_metadata", None)
+    text = getattr(response, "text", "") or ""
+    opened.set(
+        input_tokens=getattr(usage, "prompt_token_count", None),
+        output_tokens=getattr(usage, "candidates_token_count", None) or approx_tokens(text),
+        output_bytes=len(text.encode("utf-8"))
+    )
+    if getattr(response, "attempts", 1) > 1:
+        opened.set(attempts=response.attempts)
+    if getattr(response, "coalesced", False):
+        opened.set(coalesced=True)
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    def __init__(self, trace):
+        self.trace = trace
+        self._spans = {}
+
+    def _close(self, run_id, **attributes):
+        opened = self._spans.pop(run_id, None)
+        if opened is not None:
+            opened.set(**attributes)
+            opened.end = time.perf_counter()
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._spans[run_id] = self.trace.open_span("retrieval", input_bytes=len(query.encode("utf-8")))
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._close(run_id, documents=len(documents),
+                    output_bytes=sum(len(doc.page_content.encode("utf-8")) for doc in documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, error=type(error).__name__)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        if name == "PromptTemplate":
+            self._spans[run_id] = self.trace.open_span("prompt")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if run_id in self._spans:
+            text = outputs.to_string() if hasattr(outputs, "to_string") else str(outputs)
+            self._close(run_id, output_bytes=len(text.encode("utf-8")), output_tokens=approx_tokens(text))
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, error=type(error).__name__)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        prompt = "".join(str(message.content) for batch in messages for message in batch)
+        self._spans[run_id] = self.trace.open_span("llm", input_bytes=len(prompt.encode("utf-8")),
+                                                   input_tokens=approx_tokens(prompt))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        opened = self._spans.get(run_id)
+        if opened is not None and "ttft_ms" not in opened.attributes:
+            opened.set(ttft_ms=opened.duration_ms)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        text = generation.text if generation else ""
+        attributes = {"output_bytes": len(text.encode("utf-8")), "output_tokens": approx_tokens(text)}
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+            attributes.update(input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+        self._close(run_id, **attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, error=type(error).__name__)
+
+
+class MetricsRegistry:
+    def __init__(self, buckets_ms=TRACING_CONFIG["buckets_ms"], path=None):
+        self.buckets = [bucket / 1000 for bucket in buckets_ms]
+        self.path = path
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, request, stage, seconds):
+        with self._lock:
+            counts, total = self._histograms.get((request, stage), ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._histograms[(request, stage)] = (counts, total + seconds)
+
+    def add(self, name, labels, value):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+
+    def observe_trace(self, trace):
+        self.observe(trace.name, "total", trace.duration_ms / 1000)
+        if trace.error:
+            self.add("nyay_request_errors_total", (("request", trace.name), ("error", trace.error)), 1)
+        for opened in trace.spans:
+            self.observe(trace.name, opened.name, opened.duration_ms / 1000)
+            for direction in ("input", "output"):
+                for unit, metric in (("tokens", "nyay_stage_tokens_total"), ("bytes", "nyay_stage_bytes_total")):
+                    value = opened.attributes.get(f"{direction}_{unit}")
+                    if value:
+                        labels = (("request", trace.name), ("stage", opened.name), ("direction", direction))
+                        self.add(metric, labels, value)
+        if self.path:
+            self.write(self.path)
+
+    def render(self):
+        lines = [
+            "# HELP nyay_stage_duration_seconds Time spent in each stage of a request.",
+            "# TYPE nyay_stage_duration_seconds histogram"
+        ]
+        with self._lock:
+            histograms = {key: (list(counts), total) for key, (counts, total) in self._histograms.items()}
+            counters = dict(self._counters)
+
+        for (request, stage), (counts, total) in sorted(histograms.items()):
+            labels = f'request="{request}",stage="{stage}"'
+            cumulative = 0
+            for bucket, count in zip(self.buckets + [None], counts):
+                cumulative += count
+                le = "+Inf" if bucket is None else repr(bucket)
+                lines.append(f'nyay_stage_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"nyay_stage_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"nyay_stage_duration_seconds_count{{{labels}}} {cumulative}")
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                    lines.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+_registry = None
+_server = None
+_setup_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    if not TRACING_CONFIG["enabled"]:
+        return None
+    with _setup_lock:
+        if _registry is None:
+            _registry = MetricsRegistry(path=TRACING_CONFIG["metrics_path"])
+        return _registry
+
+
+def start_metrics_server(port=TRACING_CONFIG["metrics_port"], host="127.0.0.1"):
+    global _server
+    registry = get_registry()
+    if registry is None or not port:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _setup_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            except OSError as e:
+                logger.warning("Metrics endpoint not started on %s:%d: %s", host, port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            logger.info("Serving metrics on http://%s:%d/metrics", host, port)
+        return _server
@@ -1,5 +1,45 @@
 import streamlit as st
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict
+
+
+def build_source_previews(
+    guides_sources: Optional[List],
+    doc_context_used: bool,
+    document_context: str
+) -> Dict:
+    previews = {"document": None, "guides": []}
+    if doc_context_used:
+        previews["document"] = {"preview": document_context[:500], "length": len(document_context)}
+    for doc in guides_sources or []:
+        previews["guides"].append({
+            "name": ", ".join(doc.metadata.get("sources") or [doc.metadata.get("source", "Unknown Guide")]),
+            "preview": doc.page_content[:300],
+            "length": len(doc.page_content)
+        })
+    return previews
+
+
+def render_source_previews(previews: Optional[Dict], show_truncation_note: bool = True):
+    if not previews or not (previews["document"] or previews["guides"]):
+        return
+    st.subheader("Sources I used:")
+
+    document = previews["document"]
+    if document:
+        truncated_note = (
+            f"\n\n*[Showing first 500 of {document['length']} characters]*"
+            if show_truncation_note and document["length"] > 500
+            else ""
+        )
+        st.warning(f"**From Your Uploaded Document:**\n\n...{document['preview']}...{truncated_note}")
+
+    for guide in previews["guides"]:
+        truncated_note = (
+            f"\n\n*[Showing first 300 of {guide['length']} characters]*"
+            if show_truncation_note and guide["length"] > 300
+            else ""
+        )
+        st.info(f"**From {guide['name']}:**\n\n...{guide['preview']}...{truncated_note}")
 
 
 def render_sources(
@@ -8,62 +48,69 @@ def render_sources(
     document_context: str,
     show_truncation_note: bool = True
 ):
-    if (guides_sources and len(guides_sources) > 0) or doc_context_used:
-        st.subheader("Sources I used:")
-
-        if doc_context_used:
-            context_preview = document_context[:500]
-            preview_length = len(document_context)
-            truncated_note = (
-                f"\n\n*[Showing first 500 of {preview_length} characters]*"
-                if show_truncation_note and preview_length > 500
-                else ""
-            )
-            st.warning(f"**From Your Uploaded Document:**\n\n...{context_preview}...{truncated_note}")
-
-        if guides_sources:
-            for doc in guides_sources:
-                source_name = doc.metadata.get("source", "Unknown Guide")
-                content_preview = doc.page_content[:300]
-                preview_length = len(doc.page_content)
-                truncated_note = (
-                    f"\n\n*[Showing first 300 of {preview_length} characters]*"
-                    if show_truncation_note and preview_length > 300
-                    else ""
-                )
-                st.info(f"**From {source_name}:**\n\n...{content_preview}...{truncated_note}")
+    render_source_previews(build_source_previews(guides_sources, doc_context_used, document_context),
+                           show_truncation_note)
+
 
+def render_feedback_buttons(message_index: int, message: Dict, on_feedback: Optional[Callable[[int, str], None]]):
+    if message.get("feedback"):
+        st.caption(f"{'👍' if message['feedback'] == 'up' else '👎'} Thanks for your feedback!")
+        return
+
+    def vote(choice):
+        message["feedback"] = choice
+        if on_feedback is not None:
+            on_feedback(message_index, choice)
 
-def render_feedback_buttons(message_index: int):
     c1, c2, _ = st.columns([1, 1, 5])
     with c1:
-        if st.button("👍", key=f"feedback_{message_index}_up"):
-            st.toast("Thanks for your feedback!")
+        st.button("👍", key=f"feedback_{message_index}_up", on_click=vote, args=("up",))
     with c2:
-        if st.button("👎", key=f"feedback_{message_index}_down"):
-            st.toast("Thanks for your feedback!")
+        st.button("👎", key=f"feedback_{message_index}_down", on_click=vote, args=("down",))
 
 
-def render_chat_messages(
-    messages: List[Dict],
-    document_context: str,
-    show_sources: bool = True,
-    show_feedback: bool = True
+@st.fragment
+def render_assistant_message(
+    message_index: int,
+    message: Dict,
+    load_previews: Callable[[str], Optional[Dict]],
+    show_sources: bool,
+    show_feedback: bool,
+    on_feedback: Optional[Callable[[int, str], None]]
 ):
-    for i, message in enumerate(messages):
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-
-            if show_sources and message["role"] == "assistant":
-                guides_sources = message.get("sources_from_guides")
-                doc_context_used = message.get("source_from_document")
-                render_sources(guides_sources, doc_context_used, document_context)
+    with st.chat_message("assistant"):
+        st.markdown(message["content"])
+        if show_sources and message.get("sources_blob"):
+            render_source_previews(load_previews(message["sources_blob"]))
+        if show_feedback:
+            render_feedback_buttons(message_index, message, on_feedback)
 
-            if show_feedback and message["role"] == "assistant":
-                render_feedback_buttons(i)
 
-
-def render_language_selector_and_buttons(col_ratio=[3, 1]):
+def render_chat_messages(
+    messages: List[Dict],
+    load_previews: Callable[[str], Optional[Dict]],
+    visible: int,
+    on_show_earlier: Callable[[], None],
+    show_sources: bool = True,
+    show_feedback: bool = True,
+    on_feedback: Optional[Callable[[int, str], None]] = None
+) -> int:
+    hidden = max(len(messages) - visible, 0)
+    if hidden:
+        st.button(f"⬆️ Show earlier messages ({hidden} hidden)", key="show_earlier_messages",
+                  on_click=on_show_earlier)
+
+    for i in range(hidden, len(messages)):
+        message = messages[i]
+        if message["role"] == "assistant":
+            render_assistant_message(i, message, load_previews, show_sources, show_feedback, on_feedback)
+        else:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+    return len(messages) - hidden
+
+
+def render_language_selector_and_buttons(on_new_session: Callable[[], None], col_ratio=[3, 1]):
     col1, col2 = st.columns(col_ratio)
     with col1:
         language = st.selectbox(
@@ -82,12 +129,7 @@ def render_language_selector_and_buttons(col_ratio=[3, 1]):
         st.write("")
         st.write("")
         if st.button("Start New Session ♻️", key="new_session_btn", type="primary"):
-            st.session_state.messages = []
-            st.session_state.document_context = "No document uploaded."
-            st.session_state.uploaded_file_bytes = None
-            st.session_state.uploaded_file_type = None
-            st.session_state.samjhao_explanation = None
-            st.session_state.file_uploader_key += 1
+            on_new_session()
             st.rerun()
 
     return language
@@ -99,6 +141,55 @@ def render_document_context_info(document_context: str):
             st.info("**Context Loaded:** I have your uploaded document in memory. Feel free to ask questions about it!")
 
 
+def render_startup_report(report: Dict):
+    timings = [
+        f"{label} {report[key]:.0f} ms"
+        for key, label in (("import_ms", "imports"), ("first_paint_ms", "first paint"), ("ready_ms", "ready"))
+        if key in report
+    ]
+    st.caption(f"⏱️ Startup ({report['state']}): " + ", ".join(timings)
+               + (f" — {report['error']}" if report["error"] else ""))
+
+
+def render_session_memory(state_bytes: int, report: Dict, stats: Dict):
+    with st.expander(f"💾 Debug: this session holds ~{state_bytes / 1024:.0f} KB in memory, "
+                     f"{report['blob_bytes'] / 1024:.0f} KB in the blob store"):
+        st.caption(
+            f"Shared with other sessions: {report['shared_bytes'] / 1024:.0f} KB. "
+            f"Cached in memory: {report['memory_cached_bytes'] / 1024:.0f} KB. "
+            f"Blob store: {stats['blobs']} blobs for {stats['sessions']} sessions, "
+            f"{stats['disk_bytes'] / 2 ** 20:.1f} of {stats['max_bytes'] / 2 ** 20:.0f} MB on disk, "
+            f"{stats['memory_bytes'] / 2 ** 20:.1f} of {stats['max_memory_bytes'] / 2 ** 20:.0f} MB in memory."
+        )
+        if report["slots"]:
+            st.dataframe(report["slots"], use_container_width=True, hide_index=True)
+
+
+def render_trace_panel(trace: Dict):
+    with st.expander(f"⏱️ Debug: last {trace['name']} took {trace['total_ms']:.0f} ms"):
+        rows = [
+            {
+                "stage": span["name"],
+                "start (ms)": round(span["offset_ms"]),
+                "duration (ms)": round(span["duration_ms"]),
+                "tokens in": span.get("input_tokens"),
+                "tokens out": span.get("output_tokens"),
+                "bytes in": span.get("input_bytes"),
+                "bytes out": span.get("output_bytes"),
+                "details": ", ".join(
+                    f"{key}={value:.0f}" if isinstance(value, float) else f"{key}={value}"
+                    for key, value in span.items()
+                    if key not in ("name", "offset_ms", "duration_ms", "input_tokens", "output_tokens",
+                                   "input_bytes", "output_bytes")
+                )
+            }
+            for span in trace["spans"]
+        ]
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        if trace["error"]:
+            st.error(f"Failed with {trace['error']}")
+
+
 def render_disclaimer():
     st.divider()
     st.error(
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from lexical_index import build_lexical_index
+from config import (
+    CURRENT_FILE,
+    DOCSTORE_FILE,
+    HOT_RELOAD_CONFIG,
+    INDEX_FILE,
+    INDEX_SEARCH_PARAMS,
+    MANIFEST_FILE,
+    VERSIONS_DIR
+)
+
+
+logger = logging.getLogger(__name__)
+
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+DOCSTORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    chunk_key TEXT NOT NULL UNIQUE,
+    page_content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signatures (
+    id INTEGER PRIMARY KEY,
+    chunk_key TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    signature BLOB NOT NULL,
+    numbers TEXT NOT NULL
+);
+"""
+
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+SEARCH_PARAM_INDEX_TYPES = {"nprobe": faiss.IndexIVF, "efSearch": faiss.IndexHNSW}
+
+
+def chunk_id(chunk_key):
+    digest = hashlib.sha256(chunk_key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF
+
+
+class SQLiteDocstore(Docstore):
+    def __init__(self, path):
+        self._conn = sqlite3.connect(
+            f"file:{os.path.abspath(path)}?mode=ro&immutable=1",
+            uri=True,
+            check_same_thread=False
+        )
+        self._lock = threading.Lock()
+
+    def search(self, search):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_content, metadata FROM chunks WHERE id = ?", (int(search),)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=str(search), page_content=row[0], metadata=json.loads(row[1]))
+
+    def close(self):
+        self._conn.close()
+
+
+class IdentityIds(Mapping):
+    def __init__(self, index):
+        self._index = index
+
+    def __getitem__(self, key):
+        return int(key)
+
+    def __iter__(self):
+        raise TypeError("Chunk IDs are stored on disk and cannot be enumerated.")
+
+    def __len__(self):
+        return self._index.ntotal
+
+
+def index_spec(index_config, index_type=None):
+    index_type = index_type or index_config["type"]
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Use one of: {', '.join(INDEX_TYPES)}")
+    return {"type": index_type, **index_config.get(index_type, {})}
+
+
+def requires_training(spec):
+    return spec["type"] in ("ivf", "ivfpq")
+
+
+def supports_removal(spec):
+    return spec["type"] != "hnsw"
+
+
+def resolve_index_spec(spec, num_training):
+    if spec["type"] == "ivfpq" and num_training < 2 ** spec["nbits"]:
+        return {"type": "flat"}
+    if requires_training(spec):
+        return {**spec, "nlist": max(1, min(spec["nlist"], num_training // 39))}
+    return spec
+
+
+def build_index(dim, spec):
+    if spec["type"] == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    if spec["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec["M"])
+        index.hnsw.efConstruction = spec["ef_construction"]
+        return faiss.IndexIDMap2(index)
+    if spec["type"] == "ivf":
+        return faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, spec["nlist"])
+    return faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, spec["nlist"], spec["m"], spec["nbits"])
+
+
+def relevance_scores(index, distances):
+    if index.metric_type != faiss.METRIC_L2:
+        raise ValueError(f"Unsupported FAISS metric {index.metric_type}; stores are built with L2 indexes.")
+    return 1.0 - np.asarray(distances) / math.sqrt(2)
+
+
+def index_layers(index):
+    while index is not None:
+        index = faiss.downcast_index(index)
+        yield index
+        index = getattr(index, "index", None)
+
+
+def apply_search_params(index, search_params):
+    layers = list(index_layers(index))
+    parameter_space = faiss.ParameterSpace()
+    for name, value in search_params.items():
+        index_type = SEARCH_PARAM_INDEX_TYPES.get(name)
+        if index_type is not None and not any(isinstance(layer, index_type) for layer in layers):
+            continue
+        try:
+            parameter_space.set_index_parameter(index, name, value)
+        except RuntimeError as e:
+            logger.warning("Could not set FAISS search parameter %s=%r on %s: %s",
+                           name, value, type(layers[0]).__name__, str(e).strip().rsplit(":", 1)[-1].strip())
+
+
+def current_version(db_path):
+    try:
+        with open(os.path.join(db_path, CURRENT_FILE), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None, db_path
+    return version, os.path.join(db_path, VERSIONS_DIR, version)
+
+
+def new_version_id():
+    return time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + f"-{os.urandom(3).hex()}"
+
+
+def publish_version(db_path, version):
+    tmp_path = os.path.join(db_path, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(db_path, CURRENT_FILE))
+
+
+def remove_unversioned_files(db_path):
+    for name in os.listdir(db_path):
+        path = os.path.join(db_path, name)
+        if name != CURRENT_FILE and os.path.isfile(path):
+            os.remove(path)
+
+
+def prune_versions(db_path, keep_previous):
+    current, _ = current_version(db_path)
+    versions_path = os.path.join(db_path, VERSIONS_DIR)
+    names = os.listdir(versions_path)
+    previous = sorted(name for name in names if name != current and not name.endswith(".tmp"))
+    abandoned = [name for name in names if name.endswith(".tmp")]
+    for name in previous[:max(len(previous) - keep_previous, 0)] + abandoned:
+        shutil.rmtree(os.path.join(versions_path, name), ignore_errors=True)
+
+
+def is_legacy_store(db_path):
+    return (os.path.exists(os.path.join(db_path, "index.pkl")) and
+            not os.path.exists(os.path.join(db_path, DOCSTORE_FILE)))
+
+
+def load_vector_store(db_path, embeddings, mmap=True):
+    if is_legacy_store(db_path):
+        logger.warning("Loading legacy pickled store at %s into memory: no mmap, SQLite docstore or BM25 index, "
+                       "so hybrid search is dense-only. Run ingest.py --full to convert it.", db_path)
+        return FAISS.load_local(db_path, embeddings, allow_dangerous_deserialization=True)
+
+    index_path = os.path.join(db_path, INDEX_FILE)
+    index = faiss.read_index(index_path, MMAP_FLAGS) if mmap else faiss.read_index(index_path)
+    apply_search_params(index, INDEX_SEARCH_PARAMS)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=SQLiteDocstore(os.path.join(db_path, DOCSTORE_FILE)),
+        index_to_docstore_id=IdentityIds(index)
+    )
+
+
+class VectorStoreWriter:
+    def __init__(self, db_path, spec, incremental, training_sample_size=0):
+        self.db_path = db_path
+        self.version = new_version_id()
+        self.version_path = os.path.join(db_path, VERSIONS_DIR, self.version)
+        self.tmp_path = f"{self.version_path}.tmp"
+        os.makedirs(self.tmp_path)
+
+        self.spec = spec
+        self.index = None
+        self.pending_ids, self.pending_vectors = [], []
+        self.pending_count = 0
+        self.training_sample_size = training_sample_size
+        self.lexical_stats = None
+        if incremental:
+            _, source_path = current_version(db_path)
+            self.index = faiss.read_index(os.path.join(source_path, INDEX_FILE))
+            shutil.copy2(os.path.join(source_path, DOCSTORE_FILE), os.path.join(self.tmp_path, DOCSTORE_FILE))
+
+        self.conn = sqlite3.connect(os.path.join(self.tmp_path, DOCSTORE_FILE))
+        self.conn.executescript(DOCSTORE_SCHEMA)
+
+    def delete(self, chunk_keys):
+        if not chunk_keys:
+            return
+        ids = [chunk_id(key) for key in chunk_keys]
+        self.index.remove_ids(np.array(ids, dtype=np.int64))
+        self.conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+        self.conn.executemany("DELETE FROM signatures WHERE id = ?", [(i,) for i in ids])
+
+    def add(self, chunk_keys, texts, metadatas, vectors, signatures=None):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = [chunk_id(key) for key in chunk_keys]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO chunks (id, chunk_key, page_content, metadata) VALUES (?, ?, ?, ?)",
+            [(i, key, text, json.dumps(metadata))
+             for i, key, text, metadata in zip(ids, chunk_keys, texts, metadatas)]
+        )
+        if signatures:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO signatures (id, chunk_key, digest, signature, numbers) VALUES (?, ?, ?, ?, ?)",
+                [(i, key, digest, signature.tobytes(), numbers)
+                 for i, key, (digest, signature, numbers) in zip(ids, chunk_keys, signatures)]
+            )
+        ids = np.array(ids, dtype=np.int64)
+
+        if self.index is None and not requires_training(self.spec):
+            self.index = build_index(vectors.shape[1], self.spec)
+        if self.index is not None:
+            self.index.add_with_ids(vectors, ids)
+            return
+
+        self.pending_vectors.append(vectors)
+        self.pending_ids.append(ids)
+        self.pending_count += len(ids)
+        if self.pending_count >= self.training_sample_size:
+            self._build_from_pending()
+
+    def iter_signatures(self):
+        for key, digest, signature, numbers in self.conn.execute(
+                "SELECT chunk_key, digest, signature, numbers FROM signatures"):
+            yield key, (digest, np.frombuffer(signature, dtype=np.uint32), numbers)
+
+    def update_metadata(self, metadatas):
+        self.conn.executemany(
+            "UPDATE chunks SET metadata = ? WHERE id = ?",
+            [(json.dumps(metadata), chunk_id(key)) for key, metadata in metadatas.items()]
+        )
+
+    def _build_from_pending(self):
+        vectors = np.vstack(self.pending_vectors)
+        ids = np.concatenate(self.pending_ids)
+        self.pending_ids, self.pending_vectors = [], []
+        self.pending_count = 0
+
+        self.spec = resolve_index_spec(self.spec, len(vectors))
+        self.index = build_index(vectors.shape[1], self.spec)
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add_with_ids(vectors, ids)
+
+    def commit(self, manifest, keep_previous=HOT_RELOAD_CONFIG["keep_previous_versions"]):
+        if self.index is None and self.pending_count:
+            self._build_from_pending()
+        if self.index is None:
+            raise ValueError("The vector store has no vectors to save.")
+        self.conn.commit()
+        self.lexical_stats = build_lexical_index(
+            self.conn.execute("SELECT id, page_content FROM chunks"),
+            self.tmp_path
+        )
+        self.conn.close()
+        faiss.write_index(self.index, os.path.join(self.tmp_path, INDEX_FILE))
+        with open(os.path.join(self.tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({**manifest, "version": self.version, "effective_index": self.spec}, f, indent=2)
+
+        os.rename(self.tmp_path, self.version_path)
+        publish_version(self.db_path, self.version)
+        remove_unversioned_files(self.db_path)
+        prune_versions(self.db_path, keep_previous)
+
+    def abort(self):
+        self.conn.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)